@@ -14,52 +14,19 @@ Original file is located at
 
 import pandas as pd
 import numpy as np
+import time
 import matplotlib.pyplot as plt
 from sklearn import datasets
 from sklearn.cluster import DBSCAN
 from sklearn.datasets import load_iris
 from sklearn.preprocessing import MinMaxScaler
+# shared distance engine (metric registry, Distance, SquaredEuclidean, FitTrace, ...) of K_Means and DB_SCAN
+# (a metric registered with register_metric can be used by both models)
+from clustering_engine import (Metric, METRICS, register_metric, get_metric, broadcast_pairwise, Distance,
+                               compute_dtype, cast_points, SquaredEuclidean, collapse_duplicates, scatter_labels,
+                               FitTrace, make_trace)
 
-"""###**Defining Helper functions**
-
-###**Distance class definition**
->for calculating different type of distances between two n-dimensional points
-"""
-
-class Distance:
-    def __init__(self,algo='euclidean',Power=2):
-        self.algo=algo
-        # Power -> power value used for MinKowski distance
-        self.P=Power
-
-    def calc(self,p1,p2):
-        '''
-        Input
-            p1,p2 -> numpy array of size d denoting  d-dimenstional points
-        Output
-            it returns the distance(in np.float64 dtype) based on the algo
-        '''
-        if self.algo=='minkowski':
-            return self.minkowskiDist(p1,p2,self.P)
-        elif self.algo=='euclidean':
-            return self.euclideanDist(p1,p2)
-        elif self.algo=='manhatten':
-            return self.manhattenDist(p1,p2)
-    
-    def algo(self):
-        '''
-         this function returns the names of algo's that we can use in this class
-        '''
-        return ['euclidean','minkowski','manhatten']
-
-    def minkowskiDist(self,p1,p2,P):
-        return np.power(np.sum(np.power(p2-p1,P)),1/P)
-    
-    def euclideanDist(self,p1,p2):
-        return np.sqrt(np.sum(np.square(p2-p1)))
-    
-    def manhattenDist(self,p1,p2):
-        return np.sum(np.absolute(p2-p1))
+"""###**Defining Helper functions**"""
 
 # defining helper function for our code.
 def scaleDf(df,colList=[]):
@@ -75,13 +42,14 @@ def scaleDf(df,colList=[]):
     return df
 
 
-def plotClusters(df,labels,cluster_centers=[]):
+def plotClusters(df,labels,cluster_centers=[],max_points=100000,density='sample'):
     '''
     Input : 
         df -> dataFrame
         labels -> labels
+        max_points,density -> above max_points points, plot is made with density ('sample' or 'hexbin')
     Output:
-        plot the clusters
+        plot the clusters (every point is drawn in a single scatter, see scatter_labels)
     '''
     labels=np.array(labels) #convert in numpy array (if not already)
     # changing noise points label value to give noise points a diffrent color
@@ -90,19 +58,23 @@ def plotClusters(df,labels,cluster_centers=[]):
     Labels[Labels==-1]=noise_label
     #plotting
     # plotting cluster points
-    for label in np.unique(Labels):
-        # declaring name for clusters ('N'-> noise points)
-        cluster_name='C'+str(int(label)) if label!=noise_label else 'N'
-        # at color position we passed label+1 because to avoid white color(that is for 0)
-        plt.scatter(df[Labels==label].iloc[:,0],df[Labels==label].iloc[:,1],label+1,label=cluster_name)
+    uniq_labels,codes=np.unique(Labels,return_inverse=True)
+    # declaring name for clusters ('N'-> noise points)
+    names=['C'+str(int(label)) if label!=noise_label else 'N' for label in uniq_labels]
+    # every cluster gets the next color of the color cycle (noise is last)
+    colors=['C'+str(i%10) for i in range(len(uniq_labels))]
+    # marker size of a point is its label+1
+    handles=scatter_labels(df.iloc[:,0].to_numpy(),df.iloc[:,1].to_numpy(),codes.ravel(),colors,names,sizes=Labels+1,
+                           max_points=max_points,density=density)
     # plotting cluster centers
     # only plot cluster centers when cluster centers are 2D points
     cluster_centers=np.array(cluster_centers) # convert in numpy (if not already)
     if len(cluster_centers.shape)>=2 and cluster_centers.shape[1]==2:
-        for point in cluster_centers:
-            # label='CC' in plot represents cluster centers
-            plt.scatter(point[0],point[1],s=80,c=Labels.max()+2,marker='^',label='CC')
-    plt.legend(loc='upper left')
+        # label='CC' in plot represents cluster centers
+        handles.append(plt.scatter(cluster_centers[:,0],cluster_centers[:,1],s=80,
+                                   c=np.full(len(cluster_centers),Labels.max()+2),marker='^',label='CC'))
+    if handles:
+        plt.legend(handles=handles,loc='upper left')
     plt.xlabel(df.columns[0])
     plt.ylabel(df.columns[1])
     plt.plot()
@@ -187,16 +159,40 @@ def getInertia(df,labels,dist_func='euclidean',power=2):
 # (Distance class must be there and executed for working of this K_Means Class)
 # My DB_SCAN class starts here
 class DB_SCAN:
-    def __init__(self,eps=0.5, *, min_samples=5, Distance_algo='euclidean', p=2):
+    def __init__(self,eps=0.5, *, min_samples=5, Distance_algo='euclidean', p=2, dedup=False, dtype=np.float64, engine='auto', chunk_size=4096, metric_params=None, trace=None):
         self.eps=eps # radius of circle for a core point
         self.min_samples=min_samples # min number of neighbours to be called a core point
         self.Distance_algo=Distance_algo
         self.P=p #Power used for Minkowski distance
+        # metric_params -> extra params of the distance metric (e.g. {'w':feature_weights} for weighted minkowski)
+        self.metric_params=metric_params
+        # validating the distance algo and its params (raises ValueError)
+        Distance(algo=Distance_algo,Power=p,metric_params=metric_params)
+        # dedup -> if True, exact duplicate rows are collapsed into weighted unique points before fitting
+        self.dedup=dedup
+        # dtype -> storage dtype of points in distance computations (float64, float32 or float16)
+        # cluster centers and inertia are always reduced in float64
+        self.dtype=dtype
+        # engine -> 'gemm' finds euclidean neighbours with SquaredEuclidean (compared with eps^2),
+        #           'loop' uses the metric kernels of Distance class, 'auto' uses gemm for euclidean distance
+        self.engine=engine
+        self.chunk_size=chunk_size # number of points in one block of the gemm engine
+        # trace -> None (no instrumentation), True or a FitTrace object (with callbacks) to record inside fit
+        self.trace=trace
         #additional data attribute
         self.n_features_in_=0 # number of features seen during fitting
         self.labels_=np.array([]) # stores the labels of every point in data
         self.cluster_cnt_=0 # it stores the number of clusters formed after fitting the data
         self.cluster_centers_=np.array([]) # it stores cluster center of each clusters(size=cluster_cnt)
+        self.n_unique_=0 # number of points the algorithm actually ran on (after collapsing duplicates)
+        self.dtype_=np.dtype(dtype) # dtype actually used (can be wider than dtype if precision was not enough)
+        self.trace_=None # FitTrace of last fit (None if trace is not enabled)
+        # attributes of fit_ordering (reachability ordering, labels for any eps are extracted from it)
+        self.ordering_=np.array([]) # indexes of points in the order they were visited
+        self.reachability_=np.array([]) # reachability distance of every point (inf if not reachable from a core point)
+        self.core_distances_=np.array([]) # smallest eps at which a point is a core point (inf if never within max_eps)
+        self.max_eps_=np.inf # max_eps used by fit_ordering (labels can be extracted for any eps <= max_eps_)
+        self.ordering_inverse_=None # index of the unique point of every original point (None when dedup=False)
     
     def get_params(self):
         '''
@@ -206,18 +202,42 @@ class DB_SCAN:
         params['eps']=self.eps
         params['min_samples']=self.min_samples
         params['Distance_algo']=self.Distance_algo
-        params['p']=self.p
+        params['p']=self.P
+        params['metric_params']=self.metric_params
+        params['dedup']=self.dedup
+        params['dtype']=self.dtype
+        params['engine']=self.engine
+        params['chunk_size']=self.chunk_size
+        params['trace']=self.trace
         return params
 
-    def fit(self,df):
+    def fit(self,df,sample_weight=None):
         '''
         Input
             df -> a data frame containing n data points with d features each
+            sample_weight -> weight of every point (if not given every point has weight 1)
+                             a point is a core point if the total weight of its neighbours is >= min_samples
         Output
             the predicted cluster number corresponding to each point
         '''
+        # trace is None when instrumentation is disabled (then nothing below is recorded)
+        trace=make_trace(self.trace)
+        if trace is not None:
+            trace.start('DB_SCAN',n_samples=len(df),n_features=df.shape[1],
+                        params={name:value for name,value in self.get_params().items() if name!='trace'})
         # creating points
-        df_numpy=df.to_numpy(copy=True) #convert df to np array
+        df_numpy=df.to_numpy(dtype=np.float64,copy=True) #convert df to np array
+        weights=self.check_sample_weight(sample_weight,df_numpy.shape[0])
+        # inverse[i] -> index of the unique point of df_numpy[i] (None when duplicates are not collapsed)
+        inverse=None
+        if self.dedup:
+            # run the algorithm on the unique points only, duplicates only add to the weight
+            df_numpy,weights,inverse=collapse_duplicates(df_numpy,weights)
+        # store points in the (low precision) dtype used for distance computations
+        df_numpy=cast_points(df_numpy,self.dtype)
+        self.dtype_=df_numpy.dtype
+        # squared euclidean engine (row norms of df_numpy are cached once)
+        sq_engine=SquaredEuclidean(df_numpy,self.chunk_size) if self.use_gemm() else None
 
         inertia=np.inf #store the minimum inertia across runs
         
@@ -246,10 +266,12 @@ class DB_SCAN:
                 continue
             # if point p is not visited yet then visit it and find its neighbours
             #n_idxs -> its stores the index of neighbours of point p
-            n_idxs=self.get_neighbours(df_numpy[i],df_numpy)
+            n_idxs=self.get_neighbours(df_numpy[i],df_numpy,sq_engine)
+            if trace is not None:
+                trace.neighbour_query(len(n_idxs),rows)
             # type(n_idxs)=list
-            # n_cnt-> neighbours cnt of point p
-            n_cnt=len(n_idxs)
+            # n_cnt-> neighbours cnt of point p (total weight of the neighbours)
+            n_cnt=weights[n_idxs].sum()
 
             # if n_cnt is less than minpts then it become a noise point (at this moment), and then continue
             if n_cnt<minpts:
@@ -260,6 +282,8 @@ class DB_SCAN:
             c=c+1
             #assign the new cluster label to point p
             labels[i]=c
+            if trace is not None:
+                cluster_start=time.perf_counter()
 
             #creating a set of n_idxs for faster searching
             n_idxs_set=set(n_idxs)
@@ -280,8 +304,10 @@ class DB_SCAN:
                 labels[idx]=c
                 # find neighbours of q
                 # nidx-> it stores indexes of neighbours of q
-                nIdx=self.get_neighbours(q,df_numpy)
-                nCnt=len(nIdx)
+                nIdx=self.get_neighbours(q,df_numpy,sq_engine)
+                if trace is not None:
+                    trace.neighbour_query(len(nIdx),rows)
+                nCnt=weights[nIdx].sum()
                 # if q is a core point then add neighbours of q into neighbours of p (by union method)
                 if nCnt>=minpts:
                     # q is a core point
@@ -295,21 +321,173 @@ class DB_SCAN:
                         n_idxs.append(idx)
 
                 # if q is not a core point then do nothing
+            if trace is not None:
+                trace.event('cluster',cluster=c,start_point=i,expanded=len(n_idxs),
+                            expand_s=time.perf_counter()-cluster_start)
         # store the final values in corresponding attributes
-        self.n_features_in_=labels.shape[0]
-        self.labels_=labels
+        self.n_features_in_=cols
+        self.n_unique_=rows
         self.cluster_cnt_=self.get_cluster_cnt(labels)
-        self.cluster_centers_=self.get_cluster_centers(df_numpy,labels)
-        self.inertia_=self.getInertia(df_numpy,labels)
+        self.cluster_centers_=self.get_cluster_centers(df_numpy,labels,weights)
+        self.inertia_=self.getInertia(df_numpy,labels,weights)
+        # broadcast the labels of unique points back to every original point
+        if inverse is not None:
+            labels=labels[inverse]
+        self.labels_=labels
+        if trace is not None:
+            trace.stop(cluster_cnt=self.cluster_cnt_,noise_cnt=int(np.count_nonzero(labels==-1)))
+        self.trace_=trace
         return self.labels_
 
-    def get_neighbours(self,p,df_numpy):
+    def fit_ordering(self,df,sample_weight=None,max_eps=np.inf):
+        '''
+        OPTICS style reachability ordering of points, it is computed once and then DBSCAN labels
+        for any eps (<= max_eps) are extracted from it in linear time by extract_dbscan
+        (instead of running fit again for every eps)
+        Input
+            df -> a data frame containing n data points with d features each
+            sample_weight -> weight of every point (if not given every point has weight 1)
+            max_eps -> largest eps that will be extracted (smaller max_eps skips distances above it)
+        Output
+            ordering_ -> indexes of points in the order they were visited
+        '''
+        trace=make_trace(self.trace)
+        if trace is not None:
+            trace.start('DB_SCAN.fit_ordering',n_samples=len(df),n_features=df.shape[1],max_eps=max_eps,
+                        params={name:value for name,value in self.get_params().items() if name!='trace'})
+        df_numpy=df.to_numpy(dtype=np.float64,copy=True) #convert df to np array
+        weights=self.check_sample_weight(sample_weight,df_numpy.shape[0])
+        inverse=None
+        if self.dedup:
+            df_numpy,weights,inverse=collapse_duplicates(df_numpy,weights)
+        df_numpy=cast_points(df_numpy,self.dtype)
+        self.dtype_=df_numpy.dtype
+        sq_engine=SquaredEuclidean(df_numpy,self.chunk_size) if self.use_gemm() else None
+        distance=Distance(algo=self.Distance_algo,Power=self.P,dtype=df_numpy.dtype,metric_params=self.metric_params)
+        rows=df_numpy.shape[0]
+
+        # core_dists[i] -> eps at which total weight of neighbours of point i reaches min_samples
+        core_dists=self.get_core_distances(df_numpy,weights,distance,sq_engine)
+        core_dists[core_dists>max_eps]=np.inf
+        if trace is not None:
+            trace.count('distance_evals',rows*rows)
+            trace.event('core_distances',core_cnt=int(np.count_nonzero(np.isfinite(core_dists))))
+
+        reachability=np.full(rows,np.inf)
+        # reach[i] -> reachability of unvisited point i (visited points are set to inf so argmin skips them)
+        reach=np.full(rows,np.inf)
+        visited=np.zeros(rows,dtype=bool)
+        ordering=np.empty(rows,dtype=np.int64)
+        next_unvisited=0 # lowest index which may not be visited yet
+        for order_idx in range(rows):
+            # visit the unvisited point with smallest reachability (in index order if none is reachable)
+            i=int(np.argmin(reach))
+            if reach[i]==np.inf:
+                while visited[next_unvisited]:
+                    next_unvisited+=1
+                i=next_unvisited
+            visited[i]=True
+            reach[i]=np.inf
+            ordering[order_idx]=i
+            # only core points make their neighbours reachable
+            if core_dists[i]==np.inf:
+                continue
+            if sq_engine is not None:
+                dists=np.sqrt(sq_engine.sq_dist_to(df_numpy[i]))
+            else:
+                dists=distance.calc_many(df_numpy[i],df_numpy)
+            if trace is not None:
+                trace.count('distance_evals',rows)
+            # reachability of a neighbour from i is max(core distance of i, distance from i)
+            new_reach=np.maximum(dists,core_dists[i])
+            improved=(~visited)&(dists<=max_eps)&(new_reach<reachability)
+            reachability[improved]=new_reach[improved]
+            reach[improved]=new_reach[improved]
+
+        # store the final values in corresponding attributes
+        self.n_features_in_=df_numpy.shape[1]
+        self.n_unique_=rows
+        self.ordering_=ordering
+        self.reachability_=reachability
+        self.core_distances_=core_dists
+        self.max_eps_=max_eps
+        self.ordering_inverse_=inverse
+        if trace is not None:
+            trace.stop(core_cnt=int(np.count_nonzero(np.isfinite(core_dists))))
+        self.trace_=trace
+        return self.ordering_
+
+    def extract_dbscan(self,eps):
+        '''
+        (prerequisite -> fit_ordering already executed)
+        Input
+            eps -> radius of circle for a core point (<= max_eps of fit_ordering)
+        Output
+            DBSCAN labels of every point for this eps (-1 for noise), computed in linear time from the ordering
+            (core points are same as fit, but a border point visited before its core neighbours can be
+            labelled noise, and clusters are numbered in the order they are visited)
+        '''
+        if len(self.ordering_)==0:
+            print("\tPlease Contruct and Fit the Ordering First (Run the fit_ordering method)\n")
+            return np.array([])
+        if eps>self.max_eps_:
+            raise ValueError("eps should be <= max_eps of fit_ordering ("+str(self.max_eps_)+") but got "+str(eps))
+        ordering=self.ordering_
+        # a new cluster starts at a core point which is not reachable from the points visited before it
+        far_reach=self.reachability_>eps
+        near_core=self.core_distances_<=eps
+        labels=np.empty(len(ordering),dtype=np.int64)
+        labels[ordering]=np.cumsum(far_reach[ordering]&near_core[ordering])-1
+        # not reachable and not a core point -> noise
+        labels[far_reach&~near_core]=-1
+        if self.ordering_inverse_ is not None:
+            labels=labels[self.ordering_inverse_]
+        return labels
+
+    def get_core_distances(self,df_numpy,weights,distance,sq_engine=None):
+        '''
+        Input
+            df_numpy -> data points
+            weights -> weight of every point
+            distance -> Distance object of the metric
+            sq_engine -> SquaredEuclidean engine of df_numpy (if given, it is used for distances)
+        Output
+            numpy array, i-th is the smallest eps at which total weight of neighbours of point i is >= min_samples
+            (inf if total weight of every point is less than min_samples)
+        '''
+        rows=df_numpy.shape[0]
+        core_dists=np.full(rows,np.inf)
+        if weights.sum()<self.min_samples:
+            return core_dists
+        unweighted=np.all(weights==1)
+        # rows of a block are limited so that a block of distances has about 2^22 elements
+        block_rows=max(1,min(self.chunk_size,2**22//max(rows,1)))
+        for start in range(0,rows,block_rows):
+            block=df_numpy[start:start+block_rows]
+            if sq_engine is not None:
+                dists=np.sqrt(sq_engine.sq_dists_many(block))
+            else:
+                dists=distance.pairwise(block,df_numpy)
+            if unweighted:
+                # (min_samples)-th smallest distance (the point itself is its own neighbour)
+                kth=max(int(np.ceil(self.min_samples)),1)-1
+                core_dists[start:start+len(block)]=np.partition(dists,kth,axis=1)[:,kth]
+            else:
+                order=np.argsort(dists,axis=1)
+                # first neighbour (nearest first) at which the total weight reaches min_samples
+                reached=np.cumsum(weights[order],axis=1)>=self.min_samples
+                kth=np.argmax(reached,axis=1)
+                core_dists[start:start+len(block)]=dists[np.arange(len(block)),order[np.arange(len(block)),kth]]
+        return core_dists
+
+    def get_neighbours(self,p,df_numpy,sq_engine=None):
         '''
         Input
             p-> point (d dimensional point)
             eps -> epsillon distance
             df_numpy -> dataframe in numpy format
             dist_func-> denotes distance function
+            sq_engine -> SquaredEuclidean engine of df_numpy (if given, squared distances are compared with eps^2)
         Output
             (return type is list)
             index arr of neighbours which lies on/inside the d-dimensional circle with radius=eps , center=p
@@ -318,48 +496,53 @@ class DB_SCAN:
         eps=self.eps
         dist_func=self.Distance_algo
 
-        # initialize the distance class with given algo
-        distance=Distance(algo=self.Distance_algo,Power=self.P)
-        # iterate over every point in df_numpy
-        neighbours_idxs=[] # this stores indexes of neighbours 
-        for i,q in enumerate(df_numpy):
-            # dist stores distance between point p and q
-            dist=distance.calc(p,q)
-            if dist<=eps:
-                neighbours_idxs.append(i)
+        if sq_engine is not None:
+            return sq_engine.radius(p,eps).tolist()
+        # initialize the distance class with given algo (computing in the low precision dtype)
+        distance=Distance(algo=self.Distance_algo,Power=self.P,dtype=df_numpy.dtype,metric_params=self.metric_params)
+        # radius query of the metric (one vectorized call over every point in df_numpy)
+        # neighbours_idxs stores indexes of neighbours
+        neighbours_idxs=distance.radius(p,df_numpy,eps).tolist()
         return neighbours_idxs
 
-    def squared_distance_sum(self,points,centroid):
+    def squared_distance_sum(self,points,centroid,weights=None):
         '''
-        this function returns the sum of square of distance of 
-        every point in points from given centroid
+        this function returns the (weighted) sum of square of distance of 
+        every point in points from given centroid (always computed in float64)
         '''
-        distance=Distance(algo=self.Distance_algo,Power=self.P)
-        sum_squared_dist=0
-        for point in points:
-            sum_squared_dist+=np.square(distance.calc(point,centroid))
-        return sum_squared_dist
+        points=np.asarray(points,dtype=np.float64)
+        if self.use_gemm():
+            # squared euclidean distance directly (no square root that is squared again)
+            squared_dists=np.sum(np.square(points-centroid),axis=1)
+        else:
+            distance=Distance(algo=self.Distance_algo,Power=self.P,dtype=np.float64,metric_params=self.metric_params)
+            squared_dists=np.square(distance.calc_many(centroid,points))
+        if weights is not None:
+            squared_dists=weights*squared_dists
+        return squared_dists.sum()
 
     
-    def getInertia(self,df_numpy,labels):
+    def getInertia(self,df_numpy,labels,weights=None):
         '''
         Input 
           df_numpy -> data points
           labels -> list of clusters label for each point
+          weights -> weight of every point (None means every point has weight 1)
         Output
-          returns sum of squared distace from every point to there assigned cluster center
+          returns (weighted) sum of squared distace from every point to there assigned cluster center
         '''
         total_squared_dist=0
         cluster_cnt=self.get_cluster_cnt(labels)
         # if cluster center is already calculated then use it otherwise calculate it
         cluster_centers=self.cluster_centers_
         if len(self.cluster_centers_)!=cluster_cnt:
-            cluster_centers=self.get_cluster_centers(df_numpy,labels)
+            cluster_centers=self.get_cluster_centers(df_numpy,labels,weights)
         
         for cluster_num in range(cluster_cnt):
             cluster_points=df_numpy[labels==cluster_num]
             center=cluster_centers[cluster_num]
-            total_squared_dist+=self.squared_distance_sum(cluster_points,center)
+            cluster_weights=None if weights is None else weights[labels==cluster_num]
+            total_squared_dist+=self.squared_distance_sum(cluster_points,center,cluster_weights)
         return total_squared_dist
 
     def predict(self,test_df):
@@ -393,6 +576,31 @@ class DB_SCAN:
 
 
     # Helper Functions
+    def use_gemm(self):
+        '''
+        this function returns True if the SquaredEuclidean (gemm) engine is used for neighbour queries
+        '''
+        if self.engine not in ('auto','gemm','loop'):
+            raise ValueError("engine should be one of 'auto', 'gemm' or 'loop' but got "+str(self.engine))
+        is_euclidean=get_metric(self.Distance_algo).name=='euclidean'
+        if self.engine=='gemm' and not is_euclidean:
+            raise ValueError("gemm engine only supports 'euclidean' distance")
+        return self.engine!='loop' and is_euclidean
+
+    def check_sample_weight(self,sample_weight,n):
+        '''
+        this function validates sample_weight for n points and returns it as a float numpy array
+        (if sample_weight is None then every point gets weight 1)
+        '''
+        if sample_weight is None:
+            return np.ones(n)
+        sample_weight=np.asarray(sample_weight,dtype=np.float64)
+        if sample_weight.shape!=(n,):
+            raise ValueError("sample_weight should have shape ("+str(n)+",) but got "+str(sample_weight.shape))
+        if np.any(sample_weight<0):
+            raise ValueError("sample_weight should be non negative")
+        return sample_weight
+
     def get_cluster_cnt(self,labels):
         '''
         Input:
@@ -406,13 +614,14 @@ class DB_SCAN:
             cluster_cnt-=1
         return cluster_cnt
 
-    def get_cluster_centers(self,df_numpy,labels):
+    def get_cluster_centers(self,df_numpy,labels,weights=None):
         '''
         Input:
             df_numpy -> data points
             labels -> list of clusters label for each point
+            weights -> weight of every point (None means every point has weight 1)
         Output:
-            it returns array containing cluster center for each cluster
+            it returns array containing (weighted) cluster center for each cluster
         '''
         cluster_cnt=self.get_cluster_cnt(labels)  
         #creating variable for storing cluster_centers
@@ -420,7 +629,10 @@ class DB_SCAN:
         # now we iterate over clusters and find centers
         for c_num in range(cluster_cnt):
             c_num_points=df_numpy[labels==c_num]
-            cluster_centers[c_num]=((c_num_points.sum(axis=0))/(c_num_points.shape[0]))
+            if weights is None:
+                cluster_centers[c_num]=((c_num_points.sum(axis=0,dtype=np.float64))/(c_num_points.shape[0]))
+            else:
+                cluster_centers[c_num]=np.average(c_num_points,axis=0,weights=weights[labels==c_num])
         return cluster_centers
 
 # My K_Means class ends here
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of K_Means and DB_SCAN (from scratch) against sklearn KMeans and DBSCAN
+
+It generates synthetic data (blobs, moons and high dimensional blobs) of given sizes, times
+fit / predict / inertia of every engine and parameter combination, records peak memory,
+checks label agreement with sklearn (adjusted rand index) and writes a JSON and a CSV report
+so that results can be compared between versions.
+
+Usage:
+    python benchmark_clustering.py --n 1000 10000 100000 --d 2 16 256 --out bench/report
+    python benchmark_clustering.py --algos kmeans --clusters 1024 --search exact ivf --n-probe 4 8 32 (ivf speed/recall)
+    python benchmark_clustering.py --check-repro --n 20000 --d 16 (reproducibility of K_Means across n_jobs/chunk_size/engine)
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import types
+import matplotlib
+matplotlib.use('Agg') # the notebook exports plot on import of their demo cells
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn import datasets
+from sklearn.cluster import KMeans, DBSCAN
+from sklearn.metrics import adjusted_rand_score
+from sklearn.neighbors import NearestNeighbors
+from sklearn.preprocessing import StandardScaler
+
+# directory of this file (notebook exports are loaded from here)
+REPO_DIR=os.path.dirname(os.path.abspath(__file__))
+# the demo cells (loading iris, plotting) of notebook exports start at this cell
+DEMO_CELL='"""###**Loading Data and Refining**"""'
+
+
+def load_notebook_module(file_name,module_name):
+    '''
+    load_notebook_module -> executes only the definitions part of a notebook export (everything before
+                            its demo cells) and returns it as a module
+    '''
+    path=os.path.join(REPO_DIR,file_name)
+    # notebook exports import the shared clustering_engine module from the repo directory
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0,REPO_DIR)
+    with open(path) as f:
+        source=f.read()
+    source=source[:source.index(DEMO_CELL)]
+    module=types.ModuleType(module_name)
+    module.__file__=path
+    exec(compile(source,path,'exec'),module.__dict__)
+    return module
+
+
+def make_data(name,n,d,k,random_state=0):
+    '''
+    Input
+        name -> 'blobs', 'moons' or 'highdim'
+        n -> number of points
+        d -> number of features
+        k -> number of clusters (centers of blobs)
+    Output
+        standardized DataFrame of n points with d features
+    '''
+    if name=='blobs':
+        X,_=datasets.make_blobs(n_samples=n,n_features=d,centers=k,random_state=random_state)
+    elif name=='moons':
+        # moons are 2D, extra features are small noise
+        X,_=datasets.make_moons(n_samples=n,noise=0.05,random_state=random_state)
+        if d>2:
+            rng=np.random.default_rng(random_state)
+            X=np.hstack([X,0.05*rng.standard_normal((n,d-2))])
+        X=X[:,:d]
+    elif name=='highdim':
+        # few informative directions in a high dimensional space
+        X,_=datasets.make_blobs(n_samples=n,n_features=d,centers=k,cluster_std=2.0,random_state=random_state)
+    else:
+        raise ValueError("unknown dataset '"+str(name)+"'")
+    X=StandardScaler().fit_transform(X)
+    return pd.DataFrame(X,columns=['x'+str(j) for j in range(X.shape[1])])
+
+
+def estimate_eps(df,min_samples,sample_size=1000,random_state=0):
+    '''
+    estimate_eps -> median distance to the min_samples-th neighbour on a sample of points
+                    (a deterministic eps for DBSCAN that adapts to n and d)
+    '''
+    rng=np.random.default_rng(random_state)
+    pts=df.to_numpy()
+    sample=pts[rng.choice(len(pts),min(sample_size,len(pts)),replace=False)]
+    dists,_=NearestNeighbors(n_neighbors=min(min_samples,len(sample))).fit(sample).kneighbors(sample)
+    return float(np.median(dists[:,-1]))
+
+
+def measure(func,repeat=1,memory=True):
+    '''
+    Input
+        func -> function without arguments to benchmark
+        repeat -> number of timed runs (minimum time is reported)
+        memory -> if True, one more run is done under tracemalloc for peak memory
+    Output
+        (result of last run, best time in seconds, peak memory in MB or None)
+    '''
+    best=np.inf
+    for _ in range(repeat):
+        start=time.perf_counter()
+        result=func()
+        best=min(best,time.perf_counter()-start)
+    peak_mb=None
+    if memory:
+        # separate run, so tracing overhead is not part of the timings
+        tracemalloc.start()
+        func()
+        peak_mb=tracemalloc.get_traced_memory()[1]/2**20
+        tracemalloc.stop()
+    return result,best,peak_mb
+
+
+def bench_kmeans(km,df,k,engines,dtypes,repeat,memory,searches=('exact',),n_probes=(8,)):
+    '''
+    benchmarks sklearn KMeans and K_Means (every engine x dtype x search) on df, returns list of result rows
+    (ivf search is run once for every n_probe, recall is the measured recall of ivf search on fitted points)
+    '''
+    rows=[]
+    # K_Means always runs 10 seeds, so sklearn runs the same number of seeds
+    ref_model=KMeans(n_clusters=k,n_init=10,random_state=0)
+    _,fit_s,peak_mb=measure(lambda: ref_model.fit(df),repeat,memory)
+    _,predict_s,_=measure(lambda: ref_model.predict(df),repeat,False)
+    ref_labels=ref_model.labels_
+    rows.append(dict(algo='sklearn KMeans',engine='sklearn',dtype='float64',search=None,n_probe=None,recall=None,
+                     fit_s=fit_s,predict_s=predict_s,inertia_s=None,inertia=float(ref_model.inertia_),n_iter=int(ref_model.n_iter_),
+                     peak_mem_mb=peak_mb,ari_vs_sklearn=1.0))
+    # (search, n_probe) pairs, n_probe is not used by exact search
+    search_configs=[('exact',None)] if 'exact' in searches else []
+    if 'ivf' in searches:
+        search_configs+=[('ivf',n_probe) for n_probe in n_probes]
+    for engine in engines:
+        for dtype in dtypes:
+            for search,n_probe in search_configs:
+                model=km.K_Means(n_clusters=k,engine=engine,dtype=dtype,random_state=0,search=search,
+                                 n_probe=8 if n_probe is None else n_probe)
+                _,fit_s,peak_mb=measure(lambda: model.fit(df),repeat,memory)
+                _,predict_s,_=measure(lambda: model.predict(df),repeat,False)
+                pts=df.to_numpy(dtype=np.float64)
+                labels=np.asarray(model.labels_)
+                _,inertia_s,_=measure(lambda: model.getInertia(pts,labels,model.cluster_centers_),repeat,False)
+                rows.append(dict(algo='K_Means',engine=engine,dtype=str(model.dtype_),search=search,n_probe=n_probe,
+                                 recall=model.assign_recall_,fit_s=fit_s,predict_s=predict_s,inertia_s=inertia_s,
+                                 inertia=float(model.inertia_),n_iter=int(model.n_iter_),peak_mem_mb=peak_mb,
+                                 ari_vs_sklearn=adjusted_rand_score(ref_labels,labels)))
+    return rows
+
+
+def bench_dbscan(db,df,min_samples,engines,dtypes,repeat,memory):
+    '''
+    benchmarks sklearn DBSCAN and DB_SCAN (every engine x dtype) on df, returns list of result rows
+    '''
+    rows=[]
+    eps=estimate_eps(df,min_samples)
+    ref_model=DBSCAN(eps=eps,min_samples=min_samples)
+    _,fit_s,peak_mb=measure(lambda: ref_model.fit(df),repeat,memory)
+    ref_labels=ref_model.labels_
+    rows.append(dict(algo='sklearn DBSCAN',engine='sklearn',dtype='float64',eps=eps,fit_s=fit_s,predict_s=None,
+                     inertia_s=None,inertia=None,n_iter=None,peak_mem_mb=peak_mb,ari_vs_sklearn=1.0))
+    for engine in engines:
+        for dtype in dtypes:
+            model=db.DB_SCAN(eps=eps,min_samples=min_samples,engine=engine,dtype=dtype)
+            _,fit_s,peak_mb=measure(lambda: model.fit(df),repeat,memory)
+            # (DB_SCAN has no predict for new points)
+            rows.append(dict(algo='DB_SCAN',engine=engine,dtype=str(model.dtype_),eps=eps,fit_s=fit_s,predict_s=None,
+                             inertia_s=None,inertia=float(model.inertia_),n_iter=None,peak_mem_mb=peak_mb,
+                             ari_vs_sklearn=adjusted_rand_score(ref_labels,model.labels_)))
+    return rows
+
+
+def check_reproducibility(km,df,k,engines,n_jobs_list,chunk_sizes):
+    '''
+    fits K_Means (random_state=0) for every engine x n_jobs x chunk_size on df and compares labels and centroids
+    bitwise with the first configuration of the same engine, returns list of result rows
+    '''
+    rows=[]
+    for engine in engines:
+        reference=None
+        for n_jobs in n_jobs_list:
+            for chunk_size in chunk_sizes:
+                model=km.K_Means(n_clusters=k,engine=engine,n_jobs=n_jobs,chunk_size=chunk_size,random_state=0)
+                _,fit_s,_=measure(lambda: model.fit(df),1,False)
+                labels=np.asarray(model.labels_)
+                if reference is None:
+                    reference=(labels,model.cluster_centers_)
+                rows.append(dict(engine=engine,n_jobs=n_jobs,chunk_size=chunk_size,fit_s=fit_s,inertia=float(model.inertia_),
+                                 labels_equal=bool(np.array_equal(labels,reference[0])),
+                                 centers_equal=bool(np.array_equal(model.cluster_centers_,reference[1])),
+                                 centers_max_diff=float(np.max(np.abs(model.cluster_centers_-reference[1])))))
+    return rows
+
+
+def run_check_repro(args):
+    '''
+    runs check_reproducibility on blobs of the first n and d of args and returns the report (dict)
+    '''
+    km=load_notebook_module('kmeans_algo_from_scratch.py','kmeans_algo_from_scratch')
+    df=make_data('blobs',args.n[0],args.d[0],args.clusters)
+    n_jobs_list=sorted({1,2,os.cpu_count() or 1})
+    results=check_reproducibility(km,df,args.clusters,args.engines,n_jobs_list,[4096,1000])
+    return dict(tag=args.tag,created=time.strftime('%Y-%m-%dT%H:%M:%S'),check='reproducibility',
+                args={key:value for key,value in vars(args).items()},results=results)
+
+
+def run(args):
+    '''
+    runs every benchmark configuration of args and returns the report (dict)
+    '''
+    km=load_notebook_module('kmeans_algo_from_scratch.py','kmeans_algo_from_scratch')
+    db=load_notebook_module('DBSCAN_algo_full_explanation.py','DBSCAN_algo_full_explanation')
+    dtypes=[np.dtype(dtype) for dtype in args.dtypes]
+    results=[]
+    for name in args.datasets:
+        for n in args.n:
+            for d in args.d:
+                if name=='highdim' and d<args.highdim_min_d:
+                    continue
+                df=make_data(name,n,d,args.clusters)
+                config=dict(dataset=name,n=n,d=d,k=args.clusters)
+                print("benchmarking",config,flush=True)
+                if 'kmeans' in args.algos:
+                    for row in bench_kmeans(km,df,args.clusters,args.engines,dtypes,args.repeat,args.memory,
+                                            args.search,args.n_probe):
+                        results.append(dict(config,**row))
+                if 'dbscan' in args.algos and n<=args.dbscan_max_n:
+                    for row in bench_dbscan(db,df,args.min_samples,args.engines,dtypes,args.repeat,args.memory):
+                        results.append(dict(config,**row))
+    report=dict(
+        tag=args.tag,
+        created=time.strftime('%Y-%m-%dT%H:%M:%S'),
+        environment=dict(python=platform.python_version(),numpy=np.__version__,pandas=pd.__version__,
+                         sklearn=sklearn.__version__,machine=platform.machine(),cpu_count=os.cpu_count()),
+        args={key:value for key,value in vars(args).items()},
+        results=results,
+    )
+    return report
+
+
+def write_report(report,out):
+    '''
+    writes report as out.json (full report) and out.csv (one row per result)
+    '''
+    out_dir=os.path.dirname(out)
+    if out_dir:
+        os.makedirs(out_dir,exist_ok=True)
+    with open(out+'.json','w') as f:
+        json.dump(report,f,indent=2,default=str)
+    pd.DataFrame(report['results']).to_csv(out+'.csv',index=False)
+
+
+def parse_args(argv=None):
+    parser=argparse.ArgumentParser(description="benchmark K_Means and DB_SCAN against sklearn")
+    parser.add_argument('--n',type=int,nargs='+',default=[1000,10000],help="number of points (1e3 .. 1e7)")
+    parser.add_argument('--d',type=int,nargs='+',default=[2,16],help="number of features (2 .. 256)")
+    parser.add_argument('--datasets',nargs='+',default=['blobs','moons','highdim'],choices=['blobs','moons','highdim'])
+    parser.add_argument('--algos',nargs='+',default=['kmeans','dbscan'],choices=['kmeans','dbscan'])
+    parser.add_argument('--engines',nargs='+',default=['gemm','loop'],choices=['gemm','loop'])
+    parser.add_argument('--dtypes',nargs='+',default=['float64','float32'],choices=['float64','float32','float16'])
+    parser.add_argument('--search',nargs='+',default=['exact'],choices=['exact','ivf'],
+                        help="nearest centroid search of K_Means (ivf is approximate, for large --clusters)")
+    parser.add_argument('--n-probe',type=int,nargs='+',default=[8],help="n_probe values of ivf search (speed/recall)")
+    parser.add_argument('--clusters',type=int,default=8,help="number of clusters (k of K_Means, centers of blobs)")
+    parser.add_argument('--min-samples',type=int,default=10,help="min_samples of DBSCAN")
+    parser.add_argument('--dbscan-max-n',type=int,default=20000,help="DBSCAN is O(n^2), skip it above this n")
+    parser.add_argument('--highdim-min-d',type=int,default=16,help="highdim dataset is skipped below this d")
+    parser.add_argument('--repeat',type=int,default=1,help="timed runs per configuration (minimum is reported)")
+    parser.add_argument('--no-memory',dest='memory',action='store_false',help="skip the peak memory run")
+    parser.add_argument('--tag',default='',help="free text (e.g. version) stored in the report")
+    parser.add_argument('--out',default='bench_report',help="report path without extension (.json and .csv)")
+    parser.add_argument('--check-repro',action='store_true',
+                        help="instead of timings, check that K_Means gives bitwise same result for any n_jobs and chunk_size")
+    return parser.parse_args(argv)
+
+
+if __name__=='__main__':
+    args=parse_args()
+    report=run_check_repro(args) if args.check_repro else run(args)
+    write_report(report,args.out)
+    print(pd.DataFrame(report['results']).to_string())
+    if args.check_repro and not all(row['labels_equal'] and row['centers_equal'] for row in report['results']):
+        raise SystemExit("K_Means result changed with n_jobs or chunk_size")
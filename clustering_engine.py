@@ -0,0 +1,607 @@
+# -*- coding: utf-8 -*-
+"""Distance engine shared by K_Means (kmeans_algo_from_scratch.py) and DB_SCAN (DBSCAN_algo_full_explanation.py)
+
+It contains the metric registry (a metric registered here can be used by both models), the Distance class,
+low precision storage helpers, the SquaredEuclidean (gemm) engine, duplicate collapsing, the single
+scatter plot of labels and the fit instrumentation (FitTrace).
+"""
+
+import json
+import threading
+import time
+import tracemalloc
+import warnings
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+from matplotlib.colors import ListedColormap
+from matplotlib.lines import Line2D
+
+# Metric registry
+# every metric gives vectorized kernels (pairwise, one-to-many and radius query) that are used by Distance class
+
+class Metric:
+    def __init__(self,name,pairwise,one_to_many=None,radius=None,params=(),check=None,paired=None):
+        '''
+        Input
+            name -> name of the metric
+            pairwise -> pairwise(X,Y,**params) returns (n x m) distance matrix between n points X and m points Y
+            one_to_many -> one_to_many(p,Y,**params) returns m distances between point p and points Y
+                           (if not given then it is computed with pairwise)
+            radius -> radius(p,Y,eps,**params) returns indexes of points of Y with distance<=eps from p
+                      (if not given then it is computed with one_to_many)
+            params -> names of the keyword params used by the kernels (e.g. ('P','w') for minkowski)
+            check -> check(**params) raises ValueError if params are not valid for this metric
+            paired -> paired(X,Y,**params) returns n distances between X[i] and Y[i] (X and Y both n x d)
+                      (if not given then it is the diagonal of pairwise of small blocks of rows)
+        '''
+        self.name=name
+        self.pairwise=pairwise
+        self.one_to_many=one_to_many if one_to_many is not None else self.one_to_many_from_pairwise
+        self.radius=radius if radius is not None else self.radius_from_one_to_many
+        self.params=tuple(params)
+        self.check=check
+        self.paired=paired if paired is not None else self.paired_from_pairwise
+
+    def one_to_many_from_pairwise(self,p,Y,**params):
+        return self.pairwise(p[None,:],Y,**params)[0]
+
+    def radius_from_one_to_many(self,p,Y,eps,**params):
+        return np.flatnonzero(self.one_to_many(p,Y,**params)<=eps)
+
+    def paired_from_pairwise(self,X,Y,**params):
+        # pairwise of blocks of 64 rows, only its diagonal is kept (no python loop over rows)
+        out=np.empty(len(X),dtype=np.result_type(X,Y))
+        for start in range(0,len(X),64):
+            out[start:start+64]=np.diagonal(self.pairwise(X[start:start+64],Y[start:start+64],**params))
+        return out
+
+# METRICS -> name (or alias) of metric to its Metric object
+METRICS=dict()
+
+def register_metric(name,pairwise,one_to_many=None,radius=None,params=(),check=None,aliases=(),paired=None):
+    '''
+    register_metric -> registers a (custom) metric so that it can be used as Distance_algo in K_Means and DB_SCAN
+    (see Metric for the kernels, only pairwise kernel is required and it should be vectorized over X and Y)
+    it returns the registered Metric
+    '''
+    metric=Metric(name,pairwise,one_to_many,radius,params,check,paired)
+    for metric_name in (name,)+tuple(aliases):
+        METRICS[metric_name]=metric
+    return metric
+
+def get_metric(name):
+    '''
+    get_metric -> returns the registered Metric of given name (raises ValueError for unknown name)
+    '''
+    if name not in METRICS:
+        raise ValueError("unknown distance algo '"+str(name)+"', registered algos are "+str(sorted(METRICS)))
+    return METRICS[name]
+
+def broadcast_pairwise(X,Y,reduce_diff,max_elements=2**22):
+    '''
+    broadcast_pairwise -> computes (n x m) distance matrix with reduce_diff(diff) where diff=X[:,None,:]-Y[None,:,:]
+    (rows of X are processed in blocks so that a diff block has at most max_elements values)
+    '''
+    out=np.empty((len(X),len(Y)),dtype=np.result_type(X,Y))
+    block_rows=max(1,max_elements//max(1,Y.shape[0]*Y.shape[1]))
+    for start in range(0,len(X),block_rows):
+        diff=X[start:start+block_rows,None,:]-Y[None,:,:]
+        out[start:start+block_rows]=reduce_diff(diff)
+    return out
+
+# kernels of the built-in metrics
+def sqeuclidean_pairwise(X,Y):
+    # direct differences (the ||x||^2-2x.c+||c||^2 expansion is only used by SquaredEuclidean, which centers points)
+    return broadcast_pairwise(X,Y,lambda diff: np.sum(np.square(diff),axis=2))
+
+def sqeuclidean_one_to_many(p,Y):
+    return np.sum(np.square(Y-p),axis=1)
+
+def euclidean_pairwise(X,Y):
+    return np.sqrt(sqeuclidean_pairwise(X,Y))
+
+def euclidean_one_to_many(p,Y):
+    return np.sqrt(sqeuclidean_one_to_many(p,Y))
+
+def euclidean_radius(p,Y,eps):
+    # comparing squared distances with eps^2 (no square root)
+    return np.flatnonzero(sqeuclidean_one_to_many(p,Y)<=eps*eps)
+
+def manhattan_pairwise(X,Y):
+    return broadcast_pairwise(X,Y,lambda diff: np.sum(np.absolute(diff),axis=2))
+
+def manhattan_one_to_many(p,Y):
+    return np.sum(np.absolute(Y-p),axis=1)
+
+def chebyshev_pairwise(X,Y):
+    return broadcast_pairwise(X,Y,lambda diff: np.max(np.absolute(diff),axis=2))
+
+def chebyshev_one_to_many(p,Y):
+    return np.max(np.absolute(Y-p),axis=1)
+
+def minkowski_pairwise(X,Y,P=2,w=None):
+    # w -> weight of every feature (weighted minkowski distance)
+    if w is None:
+        return broadcast_pairwise(X,Y,lambda diff: np.power(np.sum(np.power(np.absolute(diff),P),axis=2),1/P))
+    w=np.asarray(w,dtype=X.dtype)
+    return broadcast_pairwise(X,Y,lambda diff: np.power(np.sum(w*np.power(np.absolute(diff),P),axis=2),1/P))
+
+def minkowski_one_to_many(p,Y,P=2,w=None):
+    powered=np.power(np.absolute(Y-p),P)
+    if w is not None:
+        powered=np.asarray(w,dtype=powered.dtype)*powered
+    return np.power(np.sum(powered,axis=1),1/P)
+
+def minkowski_check(P=2,w=None):
+    if not P>0:
+        raise ValueError("Power of minkowski distance should be > 0 but got "+str(P))
+    if w is not None and (np.ndim(w)!=1 or np.any(np.asarray(w)<0)):
+        raise ValueError("w of minkowski distance should be a 1D array of non negative feature weights")
+
+def cosine_pairwise(X,Y):
+    # zero vectors get norm 1 (so their distance from everything is 1)
+    x_norms=np.linalg.norm(X,axis=1)
+    y_norms=np.linalg.norm(Y,axis=1)
+    x_norms[x_norms==0]=1
+    y_norms[y_norms==0]=1
+    return 1-(X@Y.T)/(x_norms[:,None]*y_norms[None,:])
+
+def cosine_paired(X,Y):
+    x_norms=np.linalg.norm(X,axis=1)
+    y_norms=np.linalg.norm(Y,axis=1)
+    x_norms[x_norms==0]=1
+    y_norms[y_norms==0]=1
+    return 1-np.einsum('ij,ij->i',X,Y)/(x_norms*y_norms)
+
+# (one_to_many kernels of difference based metrics broadcast Y-p, so with p of shape n x d they are paired kernels)
+register_metric('euclidean',euclidean_pairwise,euclidean_one_to_many,euclidean_radius,aliases=('eucledian',),
+                paired=euclidean_one_to_many)
+register_metric('sqeuclidean',sqeuclidean_pairwise,sqeuclidean_one_to_many,paired=sqeuclidean_one_to_many)
+register_metric('manhattan',manhattan_pairwise,manhattan_one_to_many,aliases=('manhatten','cityblock'),
+                paired=manhattan_one_to_many)
+register_metric('chebyshev',chebyshev_pairwise,chebyshev_one_to_many,paired=chebyshev_one_to_many)
+register_metric('minkowski',minkowski_pairwise,minkowski_one_to_many,params=('P','w'),check=minkowski_check,
+                paired=minkowski_one_to_many)
+register_metric('cosine',cosine_pairwise,paired=cosine_paired)
+
+# Distance class definition
+# for calculating different type of distances between two n-dimensional points
+
+class Distance:
+    def __init__(self,algo='euclidean',Power=2,dtype=np.float64,metric_params=None):
+        self.algo=algo
+        # Power -> power value used for MinKowski distance
+        self.P=Power
+        # dtype -> dtype in which distances are computed (float16 points are computed in float32)
+        self.dtype=compute_dtype(dtype)
+        # metric -> registered Metric of the algo (ValueError for unknown algo)
+        self.metric=get_metric(algo)
+        # metric_params -> extra params of the metric (e.g. {'w':feature_weights} for weighted minkowski)
+        metric_params=dict(metric_params or {})
+        unknown_params=set(metric_params)-set(self.metric.params)
+        if unknown_params:
+            raise ValueError("metric '"+self.metric.name+"' does not take params "+str(sorted(unknown_params)))
+        params={'P':Power}
+        params.update(metric_params)
+        # only the params used by the metric kernels are passed to them
+        self.params={name:value for name,value in params.items() if name in self.metric.params}
+        if self.metric.check is not None:
+            self.metric.check(**self.params)
+
+    def calc(self,p1,p2):
+        '''
+        Input
+            p1,p2 -> numpy array of size d denoting  d-dimenstional points
+        Output
+            it returns the distance(in self.dtype) based on the algo
+        '''
+        return self.calc_many(p1,np.asarray(p2)[None,:])[0]
+
+    def calc_many(self,p,pts):
+        '''
+        Input
+            p -> numpy array of size d denoting a d-dimenstional point
+            pts -> numpy array of n points (n x d)
+        Output
+            it returns numpy array of n distances (in self.dtype), i-th is the distance between p and pts[i]
+            (vectorized version of calc for one point against many points)
+        '''
+        return self.metric.one_to_many(np.asarray(p,dtype=self.dtype),np.asarray(pts,dtype=self.dtype),**self.params)
+
+    def pairwise(self,X,Y):
+        '''
+        Input
+            X -> numpy array of n points (n x d)
+            Y -> numpy array of m points (m x d)
+        Output
+            it returns (n x m) numpy array of distances, [i,j] is the distance between X[i] and Y[j]
+        '''
+        return self.metric.pairwise(np.asarray(X,dtype=self.dtype),np.asarray(Y,dtype=self.dtype),**self.params)
+
+    def paired(self,X,Y):
+        '''
+        Input
+            X,Y -> numpy arrays of n points (n x d)
+        Output
+            it returns numpy array of n distances, i-th is the distance between X[i] and Y[i]
+        '''
+        return self.metric.paired(np.asarray(X,dtype=self.dtype),np.asarray(Y,dtype=self.dtype),**self.params)
+
+    def radius(self,p,pts,eps):
+        '''
+        it returns the indexes of points in pts which lies on/inside the circle with radius=eps , center=p
+        '''
+        return self.metric.radius(np.asarray(p,dtype=self.dtype),np.asarray(pts,dtype=self.dtype),eps,**self.params)
+
+    def algo(self):
+        '''
+         this function returns the names of algo's that we can use in this class
+        '''
+        return sorted(METRICS)
+
+    def minkowskiDist(self,p1,p2,P):
+        return np.power(np.sum(np.power(np.absolute(p2-p1),P)),1/P)
+    
+    def euclideanDist(self,p1,p2):
+        return np.sqrt(np.sum(np.square(p2-p1)))
+
+    eucledianDist=euclideanDist
+    
+    def manhattenDist(self,p1,p2):
+        return np.sum(np.absolute(p2-p1))
+
+def compute_dtype(dtype):
+    '''
+    compute_dtype -> returns the dtype in which distances are computed for points stored in dtype
+                     (float16 is only used for storage, its arithmetic is done in float32)
+    '''
+    dtype=np.dtype(dtype)
+    if dtype==np.float16:
+        return np.dtype(np.float32)
+    return dtype
+
+def cast_points(pts,dtype=np.float64,rtol=1e-3):
+    '''
+    cast_points -> casts pts to the (low precision) storage dtype used for distance computations
+    Input
+        pts -> numpy array of n points (n x d)
+        dtype -> storage dtype (np.float64, np.float32 or np.float16)
+        rtol -> accuracy guard, max allowed rounding error relative to the spread of each feature
+    Output
+        pts in the storage dtype, if the rounding error of dtype is more than rtol (or values overflow)
+        then a warning is raised and the next wider dtype is used instead
+    '''
+    dtype=np.dtype(dtype)
+    if dtype not in (np.float16,np.float32,np.float64):
+        raise ValueError("dtype should be one of float64, float32 or float16 but got "+str(dtype))
+    pts=np.asarray(pts,dtype=np.float64)
+    if dtype==np.float64 or len(pts)==0:
+        return pts
+    with np.errstate(over='ignore'):
+        low_pts=pts.astype(dtype)
+    # spread of every feature (features with zero spread are compared with their magnitude)
+    spread=np.ptp(pts,axis=0)
+    spread=np.where(spread>0,spread,np.maximum(np.abs(pts).max(axis=0),1))
+    rel_err=np.max(np.abs(low_pts.astype(np.float64)-pts)/spread)
+    if not np.isfinite(rel_err) or rel_err>rtol:
+        wider=np.float32 if dtype==np.float16 else np.float64
+        warnings.warn("precision of "+str(dtype)+" is not enough for this data (relative error "+str(rel_err)
+                      +"), using "+str(np.dtype(wider))+" instead",RuntimeWarning)
+        return cast_points(pts,wider,rtol)
+    return low_pts
+
+class SquaredEuclidean:
+    '''
+    squared euclidean distance engine, it uses the expansion ||x-c||^2 = ||x||^2 - 2x.c + ||c||^2
+    so that distances of a block of points from many points is a single matrix multiplication (BLAS)
+    (row norms of pts are cached once, square roots are never taken here)
+    the expansion cancels badly when points are far from the origin, so points (and centroids) are shifted
+    by the mean of pts, the matrix multiplication runs in the compute dtype (float32 for low precision storage)
+    and norms, reported distances and the eps^2 test of radius are in float64
+    '''
+    def __init__(self,pts,chunk_size=4096):
+        '''
+        Input
+            pts -> numpy array of n points (n x d) in storage dtype
+            chunk_size -> number of points processed in one block (bounds the memory of a block to chunk_size x k)
+        '''
+        self.pts=pts
+        self.dtype=compute_dtype(pts.dtype)
+        self.chunk_size=chunk_size
+        # mean of pts, every point is centered with it before the expansion
+        # (one reduction over all points, so it does not depend on chunk_size)
+        self.center=np.mean(pts,axis=0,dtype=np.float64) if len(pts)>0 else np.zeros(pts.shape[1])
+        if self.dtype==np.float64:
+            # float64 points are not copied, (x-m).c = x.c - m.c is used instead (precise enough in float64)
+            self.base=pts
+            self.offset=self.center
+        else:
+            # low precision points are centered once (in the compute dtype), so no correction is needed
+            self.base=np.empty(pts.shape,dtype=self.dtype)
+            for start in range(0,len(pts),chunk_size):
+                self.base[start:start+chunk_size]=pts[start:start+chunk_size]-self.center
+            self.offset=np.zeros(pts.shape[1])
+        # caching ||x-m||^2 of every point once (in float64)
+        self.sq_norms=np.empty(len(pts))
+        for start,block in self.blocks():
+            block=block-self.offset
+            self.sq_norms[start:start+len(block)]=np.einsum('ij,ij->i',block,block)
+
+    def blocks(self):
+        '''
+        generator of (start index, block of points in the compute dtype), x-m = block-offset
+        '''
+        for start in range(0,len(self.base),self.chunk_size):
+            yield start,self.base[start:start+self.chunk_size]
+
+    def center_points(self,X):
+        '''
+        it returns X-m in float64 (X is numpy array of points or a single point)
+        '''
+        return np.asarray(X,dtype=np.float64)-self.center
+
+    def nearest(self,centroids):
+        '''
+        Input
+            centroids -> numpy array of k points (k x d)
+        Output
+            labels -> labels[i] is the index of the nearest centroid of pts[i]
+            min_sq_dists -> min_sq_dists[i] is the squared distance (float64) of pts[i] from its nearest centroid
+        '''
+        centroids=self.center_points(centroids)
+        c_sq_norms=np.einsum('ij,ij->i',centroids,centroids).astype(self.dtype)
+        low_centroids=centroids.astype(self.dtype)
+        offset_dots=(low_centroids@self.offset).astype(self.dtype)
+        labels=np.empty(len(self.pts),dtype=np.int64)
+        min_sq_dists=np.empty(len(self.pts))
+        for start,block in self.blocks():
+            stop=start+len(block)
+            # ||x||^2 is same for every centroid so it is not needed for argmin
+            partial=c_sq_norms-2*(block@low_centroids.T-offset_dots)
+            labels[start:stop]=np.argmin(partial,axis=1)
+            # ||x||^2 is added in float64
+            min_sq_dists[start:stop]=self.sq_norms[start:stop]+partial[np.arange(len(block)),labels[start:stop]]
+        return labels,np.maximum(min_sq_dists,0)
+
+    def sq_dist_to(self,p):
+        '''
+        Input
+            p -> numpy array of size d denoting a d-dimenstional point
+        Output
+            numpy array of n squared distances (float64), i-th is the squared distance between p and pts[i]
+        '''
+        p=self.center_points(p)
+        low_p=p.astype(self.dtype)
+        sq_dists=np.empty(len(self.pts))
+        for start,block in self.blocks():
+            sq_dists[start:start+len(block)]=self.sq_norms[start:start+len(block)]-2*(block@low_p)
+        sq_dists+=p@p+2*(p@self.offset)
+        return np.maximum(sq_dists,0)
+
+    def sq_dists_many(self,X):
+        '''
+        Input
+            X -> numpy array of m points (m x d)
+        Output
+            (m x n) numpy array of squared distances (float64), [i,j] is the squared distance between X[i] and pts[j]
+        '''
+        X=self.center_points(X)
+        low_X=X.astype(self.dtype)
+        sq_dists=np.empty((len(X),len(self.pts)))
+        for start,block in self.blocks():
+            sq_dists[:,start:start+len(block)]=self.sq_norms[start:start+len(block)]-2*(low_X@block.T)
+        sq_dists+=(np.einsum('ij,ij->i',X,X)+2*(X@self.offset))[:,None]
+        return np.maximum(sq_dists,0)
+
+    def radius(self,p,eps):
+        '''
+        it returns the indexes of points which lies on/inside the circle with radius=eps , center=p
+        (comparing squared distances with eps^2, so no square root is taken)
+        '''
+        sq_dists=self.sq_dist_to(p)
+        if self.dtype==np.float64:
+            return np.flatnonzero(sq_dists<=eps*eps)
+        # the low precision expansion can be wrong near eps, so points near the boundary are checked again
+        # with the direct difference in float64 (error bound of the expansion is ~ eps_dtype*(||x-m||^2+||p-m||^2))
+        centered_p=self.center_points(p)
+        error=16*np.finfo(self.dtype).eps*(self.sq_norms+centered_p@centered_p)
+        idxs=np.flatnonzero(sq_dists<=eps*eps+error)
+        near=np.flatnonzero(sq_dists[idxs]>eps*eps-error[idxs])
+        exact_sq_dists=np.sum(np.square(np.asarray(self.pts[idxs[near]],dtype=np.float64)-np.asarray(p,dtype=np.float64)),axis=1)
+        keep=np.ones(len(idxs),dtype=bool)
+        keep[near]=exact_sq_dists<=eps*eps
+        return idxs[keep]
+
+# Helper functions
+
+def collapse_duplicates(pts,sample_weight=None):
+    '''
+    collapse_duplicates -> this function collapses exact duplicate rows of pts into weighted unique points
+    Input
+        pts -> numpy array of n points (n x d)
+        sample_weight -> weight of every point (if not given every point has weight 1)
+    Output
+        uniq_pts -> numpy array of unique points (in order of their first occurrence)
+        uniq_weights -> uniq_weights[j] is the total weight of all the rows collapsed into uniq_pts[j]
+        inverse -> inverse[i] is the index of pts[i] in uniq_pts (used to broadcast labels back)
+    '''
+    pts=np.asarray(pts)
+    if sample_weight is None:
+        sample_weight=np.ones(len(pts))
+    # hashing every row (O(n), no sorting) and numbering the distinct hashes
+    row_hashes=pd.util.hash_pandas_object(pd.DataFrame(pts),index=False).to_numpy()
+    inverse,uniq_hashes=pd.factorize(row_hashes)
+    # first occurrence of every unique row (writing in reverse order so first occurrence wins)
+    first_idx=np.zeros(len(uniq_hashes),dtype=np.int64)
+    first_idx[inverse[::-1]]=np.arange(len(pts))[::-1]
+    uniq_pts=pts[first_idx]
+    # a hash collision would merge two different rows, so verify and fall back to exact comparison
+    if not np.array_equal(uniq_pts[inverse],pts):
+        uniq_pts,inverse=np.unique(pts,axis=0,return_inverse=True)
+        inverse=inverse.ravel()
+    uniq_weights=np.bincount(inverse,weights=sample_weight,minlength=len(uniq_pts))
+    return uniq_pts,uniq_weights,inverse
+
+
+def scatter_labels(x,y,codes,colors,names,sizes=None,max_points=100000,density='sample',max_legend=30,random_state=408):
+    '''
+    scatter_labels -> draws every point in a single scatter, point i gets colors[codes[i]] (label indexed colormap)
+    Input
+        x,y -> numpy arrays of coordinates of n points
+        codes -> codes[i] is the index (in colors and names) of the label of i-th point
+        colors,names -> color and legend name of every label
+        sizes -> marker size of every point (None for default size)
+        max_points -> above this number of points the plot is made with density
+        density -> 'sample' (random sample of max_points points is drawn) or 'hexbin' (hexagonal bins
+                   colored by the majority label of their points)
+        max_legend -> legend handles are only made if number of labels is at most max_legend
+    Output
+        list of legend handles of labels (the scatter itself has no per label artists)
+    '''
+    x=np.asarray(x)
+    y=np.asarray(y)
+    codes=np.asarray(codes,dtype=np.int64)
+    cmap=ListedColormap(colors)
+    # color of code c is colors[c] (bins of width 1 around every code)
+    color_range=dict(cmap=cmap,vmin=-0.5,vmax=len(colors)-0.5)
+    large=len(x)>max_points
+    if large and density=='hexbin':
+        plt.hexbin(x,y,C=codes,reduce_C_function=lambda c: np.bincount(np.asarray(c,dtype=np.int64)).argmax(),
+                   gridsize=200,mincnt=1,**color_range)
+    else:
+        if large:
+            if density!='sample':
+                raise ValueError("density should be 'sample' or 'hexbin' but got "+str(density))
+            idxs=np.random.default_rng(random_state).choice(len(x),max_points,replace=False)
+            x,y,codes=x[idxs],y[idxs],codes[idxs]
+            sizes=None if sizes is None or np.ndim(sizes)==0 else np.asarray(sizes)[idxs]
+        # large plots are rasterized and drawn without marker edges (drawing the edges is most of the render time)
+        plt.scatter(x,y,c=codes,s=sizes,rasterized=large,linewidths=0 if large else None,**color_range)
+    if len(names)>max_legend:
+        return []
+    return [Line2D([],[],linestyle='',marker='o',color=color,label=name) for color,name in zip(colors,names)]
+
+# Fit instrumentation
+# opt-in trace of what happens inside fit (timings, counters, memory), nothing is recorded when it is not enabled
+
+class FitTrace:
+    def __init__(self,callbacks=(),track_memory=False):
+        '''
+        Input
+            callbacks -> list of functions, every event (dict) recorded in the trace is passed to each of them
+            track_memory -> if True, peak memory of fit is measured with tracemalloc (it slows down fit)
+        '''
+        self.callbacks=list(callbacks)
+        self.track_memory=track_memory
+        # runs of a fit can record from several threads (n_jobs), counters and events are updated under lock
+        self.lock=threading.Lock()
+        self.reset()
+
+    def reset(self):
+        '''
+        clears the trace (it is called at the start of every fit)
+        '''
+        self.model=None
+        self.events=[] # structured trace, list of events (dict)
+        self.counters=dict(distance_evals=0,reassignments=0,neighbour_queries=0,neighbour_total=0)
+        # neighbour_sizes -> histogram of neighbour counts, key k counts queries with 2^(k-1) <= size < 2^k
+        self.neighbour_sizes=dict()
+        self.neighbour_max=0
+        self.peak_memory_mb=None
+        self.total_s=None
+        self.start_time=None
+        self.started_tracemalloc=False
+
+    def start(self,model,**fields):
+        '''
+        starts the trace of a fit of model (name), fields are stored in the 'start' event
+        '''
+        self.reset()
+        self.model=model
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc=True
+        if self.track_memory:
+            tracemalloc.reset_peak()
+        self.start_time=time.perf_counter()
+        self.event('start',model=model,**fields)
+
+    def count(self,name,value=1):
+        with self.lock:
+            self.counters[name]=self.counters.get(name,0)+value
+
+    def neighbour_query(self,size,n_evals):
+        '''
+        records one neighbour query which found size neighbours with n_evals distance evaluations
+        '''
+        bucket=int(size).bit_length()
+        with self.lock:
+            self.counters['neighbour_queries']+=1
+            self.counters['neighbour_total']+=size
+            self.counters['distance_evals']+=n_evals
+            self.neighbour_sizes[bucket]=self.neighbour_sizes.get(bucket,0)+1
+            self.neighbour_max=max(self.neighbour_max,size)
+
+    def event(self,kind,**fields):
+        '''
+        records an event of given kind (with elapsed time since start) and passes it to the callbacks
+        it returns list of return values of callbacks
+        '''
+        event=dict(event=kind,elapsed_s=time.perf_counter()-self.start_time,**fields)
+        with self.lock:
+            self.events.append(event)
+        return [callback(event) for callback in self.callbacks]
+
+    def stop(self,**fields):
+        '''
+        ends the trace of fit, fields are stored in the 'end' event
+        '''
+        self.total_s=time.perf_counter()-self.start_time
+        if self.track_memory:
+            self.peak_memory_mb=tracemalloc.get_traced_memory()[1]/2**20
+            if self.started_tracemalloc:
+                tracemalloc.stop()
+                self.started_tracemalloc=False
+        self.event('end',counters=dict(self.counters),peak_memory_mb=self.peak_memory_mb,**fields)
+
+    def to_dict(self):
+        '''
+        returns the trace as a dict (JSON serializable)
+        '''
+        return dict(model=self.model,total_s=self.total_s,peak_memory_mb=self.peak_memory_mb,
+                    counters=dict(self.counters),
+                    neighbour_sizes=dict(histogram_log2={str(k):v for k,v in sorted(self.neighbour_sizes.items())},
+                                         max=self.neighbour_max),
+                    events=self.events)
+
+    def json_value(self,value):
+        '''
+        converts values that json can not serialize (numpy scalars/arrays, dtypes) to plain python values
+        '''
+        if isinstance(value,(np.generic,np.ndarray)):
+            return value.tolist()
+        if isinstance(value,type) and issubclass(value,np.generic):
+            return np.dtype(value).name
+        return str(value)
+
+    def to_json(self,path=None):
+        '''
+        returns the trace as JSON string, if path is given then it is also written to the file
+        '''
+        text=json.dumps(self.to_dict(),indent=2,default=self.json_value)
+        if path is not None:
+            with open(path,'w') as f:
+                f.write(text)
+        return text
+
+def make_trace(trace):
+    '''
+    make_trace -> returns the FitTrace used by a fit (None when tracing is disabled)
+        trace -> None/False (disabled), True (new FitTrace) or a FitTrace object
+    '''
+    if trace is None or trace is False:
+        return None
+    if trace is True:
+        return FitTrace()
+    return trace
@@ -14,11 +14,22 @@ Original file is located at
 
 import pandas as pd
 import numpy as np
+import warnings
+import time
+import threading
+import queue
+import os
+from concurrent.futures import ThreadPoolExecutor
 import matplotlib.pyplot as plt
 import random
 from sklearn.cluster import KMeans
 from sklearn.datasets import load_iris
 from sklearn.preprocessing import MinMaxScaler
+# shared distance engine (metric registry, Distance, SquaredEuclidean, FitTrace, ...) of K_Means and DB_SCAN
+# (a metric registered with register_metric can be used by both models)
+from clustering_engine import (Metric, METRICS, register_metric, get_metric, broadcast_pairwise, Distance,
+                               compute_dtype, cast_points, SquaredEuclidean, collapse_duplicates, scatter_labels,
+                               FitTrace, make_trace)
 
 """###**Defining Helper functions**"""
 
@@ -36,6 +47,72 @@ def scaleDf(df,colList=[]):
     return df
 
 
+def iter_chunks(source,chunk_size=65536):
+    '''
+    iter_chunks -> this function returns an iterator of chunks (of at most chunk_size rows) of source
+    Input
+        source -> DataFrame or numpy array (sliced), path of a .npy file (memory mapped, so only a chunk is read
+                  at a time), path of a .csv file (read with pandas chunksize) or an iterable of chunks
+                  (e.g. a parquet reader) which is returned as it is
+        chunk_size -> number of rows in a chunk
+    '''
+    if isinstance(source,str):
+        if source.endswith('.npy'):
+            source=np.load(source,mmap_mode='r')
+        elif source.endswith('.csv'):
+            return iter(pd.read_csv(source,chunksize=chunk_size))
+        else:
+            raise ValueError("only .npy and .csv files can be read in chunks but got '"+source+"'")
+    if isinstance(source,(pd.DataFrame,np.ndarray)):
+        return (source[start:start+chunk_size] for start in range(0,len(source),chunk_size))
+    return iter(source)
+
+
+def prefetch_chunks(chunks,prefetch=1):
+    '''
+    prefetch_chunks -> generator of the chunks read by a background thread, at most prefetch chunks are read
+                       ahead of the consumer (so reading of next chunks overlaps with computing on current chunk)
+    an exception in the reader is raised again in the consumer
+    '''
+    buffer=queue.Queue(maxsize=prefetch)
+    stop=threading.Event()
+    done=object() # marks the end of chunks
+
+    def put(item):
+        # waiting with timeout, so the reader can see stop when the consumer has gone
+        while not stop.is_set():
+            try:
+                buffer.put(item,timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def reader():
+        try:
+            for chunk in chunks:
+                if not put((chunk,None)):
+                    return
+        except BaseException as e:
+            put((None,e))
+            return
+        put((done,None))
+
+    thread=threading.Thread(target=reader,daemon=True)
+    thread.start()
+    try:
+        while True:
+            chunk,error=buffer.get()
+            if error is not None:
+                raise error
+            if chunk is done:
+                return
+            yield chunk
+    finally:
+        stop.set()
+        thread.join()
+
+
 def Clusters(df,labels):
     '''
     Cluters -> this function takes dataframe and labels as input and return the list of dataFrames
@@ -51,75 +128,219 @@ def Clusters(df,labels):
     return clusters
 
 
-def plotClusters(clusters):
+def cluster_colors(n_clusters):
     '''
-    plotClusters -> it takes a list of DataFrames(clusters) where every dataFrame is a cluster and plot it using scatter plot
+    cluster_colors -> colors of clusters used by the plots (random colors if there are more than 7 clusters)
     '''
     random.seed(408) #setting seed of random
     #generating random colors for each clusters
-    if(len(clusters)>7):
-        colors=[(random.randint(0,255)/255,random.randint(0,255)/255,random.randint(0,255)/255) for i in range(len(clusters))]
-    else:
-        colors=['b', 'g', 'r', 'c', 'm', 'y', 'k']
-    for i,cluster in enumerate(clusters):
-        cols=cluster.columns
-        plt.scatter(cluster[cols[0]],cluster[cols[1]],color=colors[i],label=str(i))
-        plt.xlabel(cols[0])
-        plt.ylabel(cols[1])
-    plt.legend()
+    if(n_clusters>7):
+        return [(random.randint(0,255)/255,random.randint(0,255)/255,random.randint(0,255)/255) for i in range(n_clusters)]
+    return ['b', 'g', 'r', 'c', 'm', 'y', 'k'][:max(n_clusters,1)]
+
+
+def plotLabels(df,labels,max_points=100000,density='sample'):
+    '''
+    plotLabels -> it takes a dataFrame and its labels and plot the clusters using a single scatter plot
+                  (no per cluster DataFrames, see scatter_labels for max_points and density)
+    '''
+    uniq_labels,codes=np.unique(np.asarray(labels),return_inverse=True)
+    cols=df.columns
+    handles=scatter_labels(df[cols[0]].to_numpy(),df[cols[1]].to_numpy(),codes.ravel(),cluster_colors(len(uniq_labels)),
+                           [str(label) for label in uniq_labels],max_points=max_points,density=density)
+    if handles:
+        plt.legend(handles=handles)
+    plt.xlabel(cols[0])
+    plt.ylabel(cols[1])
     plt.plot()
 
-"""###**Distance class definition**
->for calculating different type of distances between two n-dimensional points
+
+def plotClusters(clusters,max_points=100000,density='sample'):
+    '''
+    plotClusters -> it takes a list of DataFrames(clusters) where every dataFrame is a cluster and plot it using scatter plot
+                    (clusters are joined and drawn in a single scatter, see plotLabels)
+    '''
+    cols=clusters[0].columns
+    x=np.concatenate([cluster[cols[0]].to_numpy() for cluster in clusters])
+    y=np.concatenate([cluster[cols[1]].to_numpy() for cluster in clusters])
+    codes=np.repeat(np.arange(len(clusters)),[len(cluster) for cluster in clusters])
+    handles=scatter_labels(x,y,codes,cluster_colors(len(clusters)),[str(i) for i in range(len(clusters))],
+                           max_points=max_points,density=density)
+    if handles:
+        plt.legend(handles=handles)
+    plt.xlabel(cols[0])
+    plt.ylabel(cols[1])
+    plt.plot()
+
+"""###**Approximate nearest centroid search**
+>inverted file index over centroids, for very large number of clusters
 """
 
-class Distance:
-    def __init__(self,algo='eucledian',Power=2):
-        self.algo=algo
-        # Power -> power value used for MinKowski distance
-        self.P=Power
+class CentroidIndex:
+    '''
+    inverted file (IVF) index of centroids, centroids are grouped into n_lists lists by a coarse quantizer
+    and a point is only compared with the centroids of the n_probe lists nearest to it
+    (more n_probe -> higher recall but slower, n_probe=n_lists is exact search)
+    squared euclidean distance is ranked with matrix multiplications (centered expansion as in SquaredEuclidean),
+    other metrics with the pairwise kernel of the Distance object
+    '''
+    def __init__(self,centroids,distance,n_lists=None,n_probe=8,chunk_size=4096,n_train_iter=5,random_state=0,coarse=None):
+        '''
+        Input
+            centroids -> numpy array of k centroids (k x d)
+            distance -> Distance object used for ranking centroids
+            n_lists -> number of lists (coarse cells), default is sqrt(k)
+            n_probe -> number of nearest lists searched for every point
+            chunk_size -> number of points searched in one block
+            n_train_iter -> number of (euclidean) k-means iterations used to train the coarse quantizer
+            random_state -> seed for choosing initial coarse centers
+            coarse -> if given, initial coarse centers (n_lists x d), e.g. coarse of the index of previous centroids
+        '''
+        self.centroids=np.asarray(centroids,dtype=distance.dtype)
+        self.distance=distance
+        k=len(self.centroids)
+        if coarse is not None:
+            n_lists=len(coarse)
+        self.n_lists=max(1,min(k,int(np.sqrt(k)) if n_lists is None else n_lists))
+        self.n_probe=max(1,min(self.n_lists,n_probe))
+        self.chunk_size=chunk_size
+        # training coarse centers with a few k-means iterations over the centroids themselves
+        if coarse is None or len(coarse)!=self.n_lists:
+            rng=np.random.default_rng(random_state)
+            self.coarse=self.centroids[rng.choice(k,self.n_lists,replace=False)].astype(np.float64)
+        else:
+            self.coarse=np.array(coarse,dtype=np.float64)
+        engine=SquaredEuclidean(self.centroids,chunk_size)
+        for _ in range(n_train_iter):
+            assign,_=engine.nearest(self.coarse)
+            counts=np.bincount(assign,minlength=self.n_lists)
+            sums=np.empty(self.coarse.shape)
+            for j in range(self.centroids.shape[1]):
+                sums[:,j]=np.bincount(assign,weights=self.centroids[:,j],minlength=self.n_lists)
+            # lists without centroids keep their coarse center
+            non_empty=counts>0
+            self.coarse[non_empty]=sums[non_empty]/counts[non_empty,None]
+        assign,_=engine.nearest(self.coarse)
+        # lists[l] -> indexes of centroids in l-th list (centroids of a list are contiguous in order)
+        order=np.argsort(assign,kind='stable')
+        self.list_bounds=np.searchsorted(assign[order],np.arange(self.n_lists+1))
+        self.lists=[order[self.list_bounds[l]:self.list_bounds[l+1]] for l in range(self.n_lists)]
+        self.use_gemm=distance.metric.name=='sqeuclidean'
+        if self.use_gemm:
+            # centroids (sorted by list) and coarse centers shifted by the mean of centroids, cast to compute dtype
+            self.center=np.mean(self.centroids,axis=0,dtype=np.float64)
+            sorted_centroids=self.centroids[order].astype(np.float64)-self.center
+            self.sorted_centroids=sorted_centroids.astype(distance.dtype)
+            self.sorted_sq_norms=np.einsum('ij,ij->i',sorted_centroids,sorted_centroids).astype(distance.dtype)
+            centered_coarse=self.coarse-self.center
+            self.centered_coarse=centered_coarse.astype(distance.dtype)
+            self.coarse_sq_norms=np.einsum('ij,ij->i',centered_coarse,centered_coarse).astype(distance.dtype)
 
-    def calc(self,p1,p2):
+    def search(self,pts):
         '''
         Input
-            p1,p2 -> numpy array of size d denoting  d-dimenstional points
+            pts -> data points
         Output
-            it returns the distance(in np.float64 dtype) based on the algo
-        '''
-        if self.algo=='minkowski':
-            return self.minkowskiDist(p1,p2,self.P)
-        elif self.algo=='eucledian':
-            return self.eucledianDist(p1,p2)
-        elif self.algo=='manhatten':
-            return self.manhattenDist(p1,p2)
-    
-    def algo(self):
-        '''
-         this function returns the names of algo's that we can use in this class
+            nearest -> nearest[i] is the index of (approximate) nearest centroid of pts[i]
+            dists -> dists[i] is the distance (as given by self.distance) of pts[i] from centroids[nearest[i]]
         '''
-        return ['eucledian','minkowski','manhatten']
-
-    def minkowskiDist(self,p1,p2,P):
-        return np.power(np.sum(np.power(p2-p1,P)),1/P)
-    
-    def eucledianDist(self,p1,p2):
-        return np.sqrt(np.sum(np.square(p2-p1)))
-    
-    def manhattenDist(self,p1,p2):
-        return np.sum(np.absolute(p2-p1))
+        nearest=np.empty(len(pts),dtype=np.int64)
+        dists=np.empty(len(pts),dtype=np.float64)
+        for start in range(0,len(pts),self.chunk_size):
+            if self.use_gemm:
+                centered=np.asarray(pts[start:start+self.chunk_size],dtype=np.float64)-self.center
+                block_sq_norms=np.einsum('ij,ij->i',centered,centered)
+                block=centered.astype(self.distance.dtype)
+                # ||x||^2 is same for every center so it is not needed for ranking
+                coarse_dists=self.coarse_sq_norms-2*(block@self.centered_coarse.T)
+            else:
+                block=np.asarray(pts[start:start+self.chunk_size],dtype=self.distance.dtype)
+                coarse_dists=self.distance.pairwise(block,self.coarse)
+            # n_probe nearest lists of every point of the block
+            if self.n_probe<self.n_lists:
+                probe=np.argpartition(coarse_dists,self.n_probe-1,axis=1)[:,:self.n_probe]
+            else:
+                probe=np.broadcast_to(np.arange(self.n_lists),coarse_dists.shape)
+            # (point, list) pairs grouped by list, so every list is compared with all its points at once
+            pair_points=np.repeat(np.arange(len(block)),self.n_probe)
+            pair_lists=probe.ravel()
+            order=np.argsort(pair_lists,kind='stable')
+            pair_points=pair_points[order]
+            bounds=np.searchsorted(pair_lists[order],np.arange(self.n_lists+1))
+            block_nearest=np.zeros(len(block),dtype=np.int64)
+            block_dists=np.full(len(block),np.inf)
+            for l in range(self.n_lists):
+                members=pair_points[bounds[l]:bounds[l+1]]
+                candidates=self.lists[l]
+                if len(members)==0 or len(candidates)==0:
+                    continue
+                if self.use_gemm:
+                    first,last=self.list_bounds[l],self.list_bounds[l+1]
+                    list_dists=self.sorted_sq_norms[first:last]-2*(block[members]@self.sorted_centroids[first:last].T)
+                else:
+                    list_dists=self.distance.pairwise(block[members],self.centroids[candidates])
+                arg=np.argmin(list_dists,axis=1)
+                min_dists=list_dists[np.arange(len(members)),arg]
+                better=min_dists<block_dists[members]
+                block_dists[members[better]]=min_dists[better]
+                block_nearest[members[better]]=candidates[arg[better]]
+            if self.use_gemm:
+                block_dists=np.maximum(block_dists+block_sq_norms,0)
+            nearest[start:start+len(block)]=block_nearest
+            dists[start:start+len(block)]=block_dists
+        return nearest,dists
 
 """###**K-means Class Implementation**"""
 
 # (Distance class must be there and executed for working of this K_Means Class)
 # My K_Means class starts here
 class K_Means:
-    def __init__(self,n_clusters=4,Distance_algo='eucledian',Power=2,n_init=1, max_iter=300,random_state=100):
+    def __init__(self,n_clusters=4,Distance_algo='eucledian',Power=2,n_init=10, max_iter=300,random_state=100,dedup=False,dtype=np.float64,engine='auto',chunk_size=4096,metric_params=None,trace=None,tol=1e-4,inertia_tol=None,max_time=None,callback=None,init='random',warm_start=False,search='exact',n_lists=None,n_probe=8,n_jobs=1):
         self.K=n_clusters
         self.Distance_algo=Distance_algo
         self.Power=Power #Power used for Minkowski distance
-        self.n_init=10
+        # metric_params -> extra params of the distance metric (e.g. {'w':feature_weights} for weighted minkowski)
+        self.metric_params=metric_params
+        # validating the distance algo and its params (raises ValueError)
+        Distance(algo=Distance_algo,Power=Power,metric_params=metric_params)
+        self.n_init=n_init # number of runs with different random initial centroids (best run is kept)
         self.max_iter=max_iter
+        # random_state -> seed of the runs, every run gets an independent seed spawned from it (SeedSequence)
         self.random_state=random_state
+        # dedup -> if True, exact duplicate rows are collapsed into weighted unique points before fitting
+        self.dedup=dedup
+        # dtype -> storage dtype of points in distance computations (float64, float32 or float16)
+        # centroids and inertia are always reduced in float64
+        self.dtype=dtype
+        # engine -> 'gemm' computes euclidean assignments with SquaredEuclidean (matrix multiplications),
+        #           'loop' uses the metric kernels of Distance class, 'auto' uses gemm for euclidean distance
+        self.engine=engine
+        self.chunk_size=chunk_size # number of points in one block of distance computations
+        # trace -> None (no instrumentation), True or a FitTrace object (with callbacks) to record inside fit
+        self.trace=trace
+        # tol -> a run stops when the total squared shift of centroids is <= tol * (mean variance of features)
+        self.tol=tol
+        # inertia_tol -> if given, a run stops when the relative change of inertia between iterations is <= inertia_tol
+        self.inertia_tol=inertia_tol
+        # max_time -> if given, max wall-clock seconds of a fit (remaining runs are skipped after it)
+        #             (it depends on timing, so with n_jobs>1 the runs that reach it can differ from n_jobs=1)
+        self.max_time=max_time
+        # callback -> if given, it is called after every iteration with a dict of the iteration info,
+        #             if it returns True the fit is aborted (best of the runs up to this run is kept,
+        #             same for any n_jobs)
+        self.callback=callback
+        # init -> 'random' (k random points, n_init runs) or numpy array (k x d) of initial centroids (one run)
+        self.init=init
+        # warm_start -> if True and model is already fitted, fit starts from the current cluster_centers_ (one run)
+        self.warm_start=warm_start
+        # search -> 'exact' compares every point with every centroid, 'ivf' uses CentroidIndex (approximate,
+        #           for very large n_clusters) in assignment step and predict
+        self.search=search
+        self.n_lists=n_lists # number of lists of CentroidIndex (default sqrt(n_clusters))
+        self.n_probe=n_probe # number of lists searched per point (recall/speed knob of ivf search)
+        # n_jobs -> number of threads running the n_init runs in parallel (-1 means number of cpus),
+        #           result is same for any n_jobs (unless max_time stops the fit)
+        self.n_jobs=n_jobs
         #additional data attribute (similar to sklearn Kmeans)
         self.cluster_centers_=np.array([])
         self.labels_=np.array([])
@@ -127,6 +348,13 @@ class K_Means:
         self.n_iter_=0
         self.n_features_in_=0
         self.feature_names_in_=np.array([])
+        self.n_unique_=0 # number of points the algorithm actually ran on (after collapsing duplicates)
+        self.dtype_=np.dtype(dtype) # dtype actually used (can be wider than dtype if precision was not enough)
+        self.trace_=None # FitTrace of last fit (None if trace is not enabled)
+        # why the best run stopped ('reassign', 'tol', 'inertia_tol', 'max_iter', 'max_time' or 'callback')
+        self.stop_reason_=None
+        self.centroid_index_=None # CentroidIndex of cluster_centers_ built at the end of fit (None for exact search)
+        self.assign_recall_=None # measured recall of ivf search on a sample of fitted points (None for exact search)
     
     def get_params(self):
         '''
@@ -136,84 +364,272 @@ class K_Means:
         params['n_clusters']=self.K
         params['Distance_algo']=self.Distance_algo
         params['Power']=self.Power
+        params['metric_params']=self.metric_params
         params['n_init']=self.n_init
         params['max_iter']=self.max_iter
         params['max_iter']=self.max_iter
         params['random_state']=self.random_state
+        params['dedup']=self.dedup
+        params['dtype']=self.dtype
+        params['engine']=self.engine
+        params['chunk_size']=self.chunk_size
+        params['trace']=self.trace
+        params['tol']=self.tol
+        params['inertia_tol']=self.inertia_tol
+        params['max_time']=self.max_time
+        params['callback']=self.callback
+        params['init']=self.init
+        params['warm_start']=self.warm_start
+        params['search']=self.search
+        params['n_lists']=self.n_lists
+        params['n_probe']=self.n_probe
+        params['n_jobs']=self.n_jobs
         return params
 
-    def fit(self,df):
+    def fit(self,df,sample_weight=None):
         '''
         Input
             df -> a data frame containing n data points with d features each
-            random_state -> a random_state value to be used as seed for random
+            sample_weight -> weight of every point (if not given every point has weight 1)
         Output
             the predicted cluster number corresponding to each point
         '''
+        fit_start=time.perf_counter()
+        # trace is None when instrumentation is disabled (then nothing below is recorded)
+        trace=make_trace(self.trace)
+        if trace is not None:
+            trace.start('K_Means',n_samples=len(df),n_features=df.shape[1],
+                        params={name:value for name,value in self.get_params().items() if name!='trace'})
         # creating points
-        pts=df.to_numpy(copy=True) #convert df to np array
-        n_init=self.n_init
+        pts=df.to_numpy(dtype=np.float64,copy=True) #convert df to np array
+        weights=self.check_sample_weight(sample_weight,len(pts))
+        # inverse[i] -> index of the unique point of pts[i] (None when duplicates are not collapsed)
+        inverse=None
+        if self.dedup:
+            # run the algorithm on the unique points only, duplicates only add to the weight
+            pts,weights,inverse=collapse_duplicates(pts,weights)
+        # store points in the (low precision) dtype used for distance computations
+        pts=cast_points(pts,self.dtype)
+        self.dtype_=pts.dtype
+        # squared euclidean engine (row norms of pts are cached once for every run)
+        sq_engine=SquaredEuclidean(pts,self.chunk_size) if self.use_gemm() else None
+        # tol is relative to the data (same as sklearn), so it is scaled with mean variance of features
+        tol_shift=self.tol*np.mean(np.var(pts,axis=0,dtype=np.float64))
+        # given initial centroids (None means k random points in every run)
+        init_centroids=self.get_init_centroids(pts.shape[1])
+        if init_centroids is None and self.K>len(pts):
+            # (collapsing duplicates can leave fewer points than clusters), extra centroids repeat points
+            warnings.warn("n_clusters ("+str(self.K)+") is more than the number of "+("unique " if self.dedup else "")
+                          +"points ("+str(len(pts))+"), some clusters will be empty",RuntimeWarning)
+        n_init=self.n_init if init_centroids is None else 1
         '''
         n_init -> Number of time the k-means algorithm will be run with different centroid seeds.
-        The final results will be the best output of n_init consecutive runs in terms of inertia.
+        The final results will be the best output of n_init runs in terms of inertia.
+        (only one run when initial centroids are given, every run would be same)
         '''
+        # every run gets its own independent seed spawned from random_state, so a run gives the same
+        # result whichever thread runs it and in whichever order
+        run_seeds=np.random.SeedSequence(self.random_state).spawn(n_init)
+        # aborted_at[0] -> lowest index of a run stopped by max_time or callback, runs after it are skipped
+        # (or discarded if another thread had already started them), so the kept runs are the same as with n_jobs=1
+        aborted_at=[n_init]
+        abort_lock=threading.Lock()
+
+        def run(run_no):
+            if run_no>aborted_at[0]:
+                return None
+            result=self.single_run(run_no,pts,weights,init_centroids,run_seeds[run_no],sq_engine,tol_shift,fit_start,trace)
+            if result['stop_reason'] in ('max_time','callback'):
+                with abort_lock:
+                    aborted_at[0]=min(aborted_at[0],run_no)
+            return result
+
+        n_jobs=self.get_n_jobs(n_init)
+        if n_jobs==1:
+            results=[run(run_no) for run_no in range(n_init)]
+        else:
+            # distance computations (BLAS, numpy) release the GIL, so runs are parallel in threads
+            with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                results=list(executor.map(run,range(n_init)))
+            results=[result if run_no<=aborted_at[0] else None for run_no,result in enumerate(results)]
+        # best run is the one with minimum inertia (first run among equal inertia), same for any n_jobs
         min_inertia=np.inf #store the minimum inertia across runs
-        while n_init:
-            # initially choose k random points as centroids
-            centroids=pts[self.K_uniq_rand_ints(self.K,len(pts),self.random_state+n_init)]
-            # clusters array will store cluster corresponding to every point
-            # initially starts cluster corresponding to every point as -1
-            clusters=[-1 for i in range(len(pts))]
-
-            # Iterating and assigning centroids untill no change in centroids
-            iteration=0
-            while True:
-                # Assign point to nearest Centroid
-                reassign_cnt=self.AssignCentroids(pts,centroids,clusters)
-                # update centroids based on reassignment
-                self.updateCentroids(pts,centroids,clusters)
-                # Loop break condition
-                if reassign_cnt==0 or iteration>self.max_iter:
-                    break
-                iteration+=1
-            # decrease n_init
-            n_init-=1
-            # calculating inertia
-            inertia=self.getInertia(pts,clusters,centroids)
-            # if clustering is better then update the parameters
-            if inertia<min_inertia:
-                min_inertia=inertia
-                # store attribute values
-                self.cluster_centers_=centroids
-                self.labels_=clusters
-                self.n_iter_=iteration
-                self.n_features_in_=len(pts[0])
-                self.feature_names_in_=np.array(df.columns)
-                self.inertia_=min_inertia
+        for result in results:
+            if result is None or not result['inertia']<min_inertia:
+                continue
+            min_inertia=result['inertia']
+            # store attribute values
+            self.cluster_centers_=result['centroids']
+            self.labels_=result['clusters']
+            # broadcast the labels of unique points back to every original point
+            if inverse is not None:
+                self.labels_=result['clusters'][inverse]
+            self.n_unique_=len(pts)
+            self.n_iter_=result['n_iter']
+            self.stop_reason_=result['stop_reason']
+            self.n_features_in_=len(pts[0])
+            self.feature_names_in_=np.array(df.columns)
+            self.inertia_=min_inertia
+        # index of the final centroids is built once, it is reused by predict, predict_iter and measure_recall
+        self.centroid_index_=self.build_index(self.cluster_centers_) if self.use_ivf() else None
+        if self.use_ivf():
+            # recall of approximate search with final centroids on a sample of points
+            self.assign_recall_=self.search_recall(pts)
+        if trace is not None:
+            trace.stop(inertia=self.inertia_,n_iter=self.n_iter_,assign_recall=self.assign_recall_)
+        self.trace_=trace
         #return the cluster labels        
         return self.labels_
 
-    def AssignCentroids(self,pts,centroids,clusters):
+    def single_run(self,run_no,pts,weights,init_centroids,seed,sq_engine,tol_shift,fit_start,trace=None):
+        '''
+        Input
+          run_no -> index of this run (in trace events and callback info)
+          pts,weights -> data points and their weights
+          init_centroids -> initial centroids (None means K random points chosen with seed)
+          seed -> SeedSequence of this run
+          sq_engine -> SquaredEuclidean engine of pts (None for the metric kernels)
+          tol_shift -> run stops when total squared shift of centroids is <= tol_shift
+          fit_start -> perf_counter at the start of fit (for max_time)
+        Output
+          dict of centroids, clusters, inertia, n_iter and stop_reason of this run
+        '''
+        # initially choose k random points as centroids
+        # (centroids are kept in float64, points are cast down only while computing distances)
+        if init_centroids is None:
+            centroids=pts[self.K_uniq_rand_ints(self.K,len(pts),seed)].astype(np.float64)
+        else:
+            centroids=init_centroids.copy()
+        # clusters array will store cluster corresponding to every point
+        # initially starts cluster corresponding to every point as -1
+        clusters=np.full(len(pts),-1,dtype=np.int64)
+        # sq_dists[i] -> squared distance of pts[i] from its assigned centroid (filled by AssignCentroids)
+        sq_dists=np.empty(len(pts),dtype=np.float64)
+
+        # Iterating and assigning centroids untill centroids (or inertia) do not change enough
+        iteration=0
+        prev_inertia=np.inf
+        index=None
+        while True:
+            if trace is not None:
+                assign_start=time.perf_counter()
+            if self.use_ivf():
+                # index of current centroids (coarse quantizer of previous iteration is reused)
+                index=self.build_index(centroids,None if index is None else index.coarse)
+            # Assign point to nearest Centroid
+            reassign_cnt=self.AssignCentroids(pts,centroids,clusters,sq_engine,sq_dists,index)
+            # inertia of this assignment (before centroids are updated)
+            iter_inertia=float(np.dot(weights,sq_dists))
+            if trace is not None:
+                update_start=time.perf_counter()
+            # update centroids based on reassignment
+            old_centroids=centroids.copy()
+            # (empty clusters are reseeded from the points with highest error)
+            reseed_cnt=self.updateCentroids(pts,centroids,clusters,weights,sq_dists)
+            centroid_shift=float(np.sum(np.square(centroids-old_centroids)))
+            if trace is not None:
+                trace.count('distance_evals',len(pts)*len(centroids))
+                trace.count('reassignments',reassign_cnt)
+                trace.event('iteration',run=run_no,iteration=iteration,reassign_cnt=reassign_cnt,reseed_cnt=reseed_cnt,
+                            inertia=iter_inertia,centroid_shift=centroid_shift,
+                            assign_s=update_start-assign_start,update_s=time.perf_counter()-update_start)
+            # Loop break conditions
+            stop_reason=None
+            # (reseeded centroids have not been assigned any points yet, so run can not converge now)
+            if reseed_cnt==0 and reassign_cnt==0:
+                stop_reason='reassign'
+            elif reseed_cnt==0 and centroid_shift<=tol_shift:
+                stop_reason='tol'
+            elif reseed_cnt==0 and self.inertia_tol is not None and abs(prev_inertia-iter_inertia)<=self.inertia_tol*iter_inertia:
+                stop_reason='inertia_tol'
+            elif iteration>self.max_iter:
+                stop_reason='max_iter'
+            elif self.max_time is not None and time.perf_counter()-fit_start>self.max_time:
+                stop_reason='max_time'
+            if self.callback is not None:
+                info=dict(run=run_no,iteration=iteration,reassign_cnt=reassign_cnt,inertia=iter_inertia,
+                          centroid_shift=centroid_shift,elapsed_s=time.perf_counter()-fit_start,centroids=centroids)
+                if self.callback(info):
+                    stop_reason='callback'
+            if stop_reason is not None:
+                break
+            prev_inertia=iter_inertia
+            iteration+=1
+        # calculating inertia
+        inertia=self.getInertia(pts,clusters,centroids,weights)
+        if trace is not None:
+            trace.event('run_end',run=run_no,n_iter=iteration,inertia=inertia,stop_reason=stop_reason)
+        return dict(centroids=centroids,clusters=clusters,inertia=inertia,n_iter=iteration,stop_reason=stop_reason)
+
+    def AssignCentroids(self,pts,centroids,clusters,sq_engine=None,sq_dists=None,index=None):
         '''
         Input:
           pts -> data points
           centroids -> Current cluster centroids
           clusters -> clusters[i] is the cluster number of pts[i] point.
+          sq_engine -> SquaredEuclidean engine of pts (if given, all points are assigned with matrix multiplications)
+          sq_dists -> if given, sq_dists[i] is set to the squared distance of pts[i] from its nearest centroid
+          index -> CentroidIndex of centroids (for ivf search)
         Output:
           it returns number of cluster reassignment (no. of points for which cluster number changed)
         '''
-        # reassign_ptr counts the reassignment of clusters
-        reassign_ptr=0
-        for i,point in enumerate(pts):
-            '''
-             for every point we find the nearest cluster centroid and if it is diffrent
-             than previous then we update the cluster no. of the point and increase the reassignment pointer
-            '''
-            nearest_cluster_num=self.get_nearest_centroid(point,centroids)
-            if nearest_cluster_num!=clusters[i]:
-                clusters[i]=nearest_cluster_num
-                reassign_ptr+=1
-        return reassign_ptr
+        '''
+         for every point we find the nearest cluster centroid and if it is diffrent
+         than previous then we update the cluster no. of the point and count it as a reassignment
+        '''
+        nearest,min_sq_dists=self.nearest_centroids(pts,centroids,sq_engine,return_sq_dists=True,index=index)
+        if self.use_ivf():
+            # approximate search can miss the current centroid of a point (and different indexes miss different
+            # centroids), so a point only moves if the found centroid is closer than its current centroid
+            assigned=np.flatnonzero(clusters>=0)
+            current_sq_dists=self.paired_sq_dists(pts[assigned],centroids,clusters[assigned])
+            keep=assigned[current_sq_dists<=min_sq_dists[assigned]]
+            nearest[keep]=clusters[keep]
+            min_sq_dists[keep]=current_sq_dists[current_sq_dists<=min_sq_dists[assigned]]
+        reassign_cnt=int(np.count_nonzero(nearest!=clusters))
+        clusters[:]=nearest
+        if sq_dists is not None:
+            sq_dists[:]=min_sq_dists
+        return reassign_cnt
+
+    def nearest_centroids(self,pts,centroids,sq_engine=None,return_sq_dists=False,exact=False,index=None):
+        '''
+        Input:
+          pts -> data points
+          centroids -> list of all centroids points
+          sq_engine -> SquaredEuclidean engine of pts (if given, it is used instead of the metric kernels)
+          return_sq_dists -> if True then squared distances from the nearest centroids are also returned
+          exact -> if True then exact search is used even if search is 'ivf'
+          index -> CentroidIndex of centroids for ivf search (if not given then it is built for centroids)
+        Output
+          it returns numpy array, i-th value is the index number of nearest centroid point from pts[i]
+          (and numpy array of squared distances from the nearest centroids if return_sq_dists is True)
+        '''
+        if not exact and self.use_ivf():
+            is_euclidean,_=self.ranking_distance()
+            if index is None:
+                index=self.build_index(centroids)
+            nearest,dists=index.search(pts)
+            if not return_sq_dists:
+                return nearest
+            return nearest,(dists if is_euclidean else np.square(dists))
+        if sq_engine is not None:
+            nearest,min_sq_dists=sq_engine.nearest(centroids)
+            return (nearest,min_sq_dists) if return_sq_dists else nearest
+        # initialize the distance class with a particular algo (computing in the low precision dtype)
+        distance=Distance(algo=self.Distance_algo,Power=self.Power,dtype=self.dtype_,metric_params=self.metric_params)
+        # casting centroids once to the dtype used for distance computations
+        centroids=np.asarray(centroids).astype(distance.dtype)
+        nearest=np.empty(len(pts),dtype=np.int64)
+        min_sq_dists=np.empty(len(pts),dtype=np.float64)
+        # pairwise distances of a block of points from every centroid, argmin keeps the first minimum
+        for start in range(0,len(pts),self.chunk_size):
+            block=pts[start:start+self.chunk_size]
+            block_dists=distance.pairwise(block,centroids)
+            block_nearest=np.argmin(block_dists,axis=1)
+            nearest[start:start+len(block)]=block_nearest
+            min_sq_dists[start:start+len(block)]=np.square(block_dists[np.arange(len(block)),block_nearest])
+        return (nearest,min_sq_dists) if return_sq_dists else nearest
 
     def get_nearest_centroid(self,point,centroids):
         '''
@@ -223,58 +639,85 @@ class K_Means:
         Output
           it return the index number of nearest centroid point from the given point
         '''
-        mindist=np.inf
-        # initialize the distance class with a particular algo
-        distance=Distance(algo=self.Distance_algo,Power=self.Power)
-        for idx,centroid in enumerate(centroids):
-            dist=distance.calc(point,centroid)
-            if dist<mindist:
-                min_dist_idx=idx
-                mindist=dist
-        return min_dist_idx
+        # initialize the distance class with a particular algo (computing in the low precision dtype)
+        distance=Distance(algo=self.Distance_algo,Power=self.Power,dtype=self.dtype_,metric_params=self.metric_params)
+        # distances from point to every centroid in one vectorized call, argmin keeps the first minimum
+        return int(np.argmin(distance.calc_many(point,centroids)))
       
-    def updateCentroids(self,pts,centroids,clusters):
+    def updateCentroids(self,pts,centroids,clusters,weights=None,sq_dists=None):
         '''
         Input
           pts -> data points
           centroids -> centroid points(that needs to be updated)
           clusters-> cluster array of points after reassignment
+          weights -> weight of every point (None means every point has weight 1)
+          sq_dists -> squared distance of every point from its assigned centroid, if given then
+                      empty clusters are reseeded from the points with highest error (weight x squared distance)
+                      (only points with positive error, a point with zero error already sits on a centroid)
         Output
-          returns nothing.
+          returns number of empty clusters that were reseeded.
           its Updtates the centroid points based on the Cluster array.
-          i.e centroids[i]=mean of all points have cluster number=i
+          i.e centroids[i]=(weighted) mean of all points have cluster number=i
         '''
-        for cluster_num in np.unique(clusters):
-            #get all points with cluster value
-            cluster_points=pts[np.where(clusters==cluster_num)]
-            #update the centroid
-            centroids[cluster_num]=cluster_points.mean(axis=0)
+        clusters=np.asarray(clusters)
+        if weights is None:
+            weights=np.ones(len(pts))
+        K=len(centroids)
+        # total weight and (float64) weighted sum of points of every cluster in one pass over the points
+        cluster_weights=np.bincount(clusters,weights=weights,minlength=K)
+        cluster_sums=np.empty((K,pts.shape[1]))
+        for j in range(pts.shape[1]):
+            cluster_sums[:,j]=np.bincount(clusters,weights=weights*pts[:,j],minlength=K)
+        #update the centroids (only of clusters that have points)
+        non_empty=cluster_weights>0
+        centroids[non_empty]=cluster_sums[non_empty]/cluster_weights[non_empty,None]
+        # empty clusters would keep stale centroids forever, so they are moved to the worst fitted points
+        empty=np.flatnonzero(~non_empty)
+        if sq_dists is None or len(empty)==0:
+            return 0
+        errors=weights*sq_dists
+        n_reseed=min(len(empty),int(np.count_nonzero(errors>0)))
+        if n_reseed==0:
+            return 0
+        # indexes of n_reseed points with highest error (highest first)
+        worst=np.argpartition(errors,len(pts)-n_reseed)[len(pts)-n_reseed:]
+        worst=worst[np.argsort(errors[worst])[::-1]]
+        centroids[empty[:n_reseed]]=pts[worst]
+        return n_reseed
 
-    def squared_distance_sum(self,points,centroid):
+    def squared_distance_sum(self,points,centroid,weights=None):
         '''
-        this function returns the sum of square of distance of 
-        every point in points from given centroid
+        this function returns the (weighted) sum of square of distance of 
+        every point in points from given centroid (always computed in float64)
         '''
-        distance=Distance(algo=self.Distance_algo,Power=self.Power)
-        sum_squared_dist=0
-        for point in points:
-            sum_squared_dist+=np.square(distance.calc(point,centroid))
-        return sum_squared_dist
+        points=np.asarray(points,dtype=np.float64)
+        if self.use_gemm():
+            # squared euclidean distance directly (no square root that is squared again)
+            squared_dists=np.sum(np.square(points-centroid),axis=1)
+        else:
+            distance=Distance(algo=self.Distance_algo,Power=self.Power,dtype=np.float64,metric_params=self.metric_params)
+            squared_dists=np.square(distance.calc_many(centroid,points))
+        if weights is not None:
+            squared_dists=weights*squared_dists
+        return squared_dists.sum()
 
-    def getInertia(self,pts,clusters,centroids):
+    def getInertia(self,pts,clusters,centroids,weights=None):
         '''
         Input 
           pts -> data points
           clusters -> cluster number corresponding to data points
           centroids -> cluster centers
+          weights -> weight of every point (None means every point has weight 1)
         Output
-          returns sum of squared distace from every point to there assigned cluster center
+          returns (weighted) sum of squared distace from every point to there assigned cluster center
         '''
         total_squared_dist=0
         for cluster_num in np.unique(clusters):
-            cluster_points=pts[np.where(clusters==cluster_num)]
+            cluster_idxs=np.where(clusters==cluster_num)
+            cluster_points=pts[cluster_idxs]
             centroid=centroids[cluster_num]
-            total_squared_dist+=self.squared_distance_sum(cluster_points,centroid)
+            cluster_weights=None if weights is None else weights[cluster_idxs]
+            total_squared_dist+=self.squared_distance_sum(cluster_points,centroid,cluster_weights)
         return total_squared_dist
 
     def predict(self,test_df):
@@ -286,15 +729,118 @@ class K_Means:
             returns Cluster number corresponding to each test data point
         '''
         # Print error if models is prerequisite not satisfied
-        if(self.n_iter_==0):
+        if(len(self.cluster_centers_)==0):
             print("\tPlease Contruct and Fit the Model First (Run the Fit method)\n")
             return np.array([])
-        test_pts=test_df.to_numpy(copy=True) #convert test_df to np array
-        labels=[-1 for i in range(len(test_pts))]
-        for i,point in enumerate(test_pts):
-            labels[i]=self.get_nearest_centroid(point,self.cluster_centers_)
-        return labels
+        test_pts=test_df.to_numpy(dtype=np.float64,copy=True) #convert test_df to np array
+        test_pts=cast_points(test_pts,self.dtype_)
+        sq_engine=SquaredEuclidean(test_pts,self.chunk_size) if self.use_gemm() else None
+        return self.nearest_centroids(test_pts,self.cluster_centers_,sq_engine,index=self.centroid_index_)
     
+    def predict_iter(self,chunks,prefetch=0):
+        '''
+        (prerequisite -> fit already executed (model already built))
+        streaming version of predict, memory is bounded by one chunk (plus prefetch chunks) at a time
+        Input :
+            chunks -> test data points as accepted by iter_chunks (DataFrame or numpy array is read in chunks of
+                      chunk_size rows, path of a .npy/.csv file, or an iterable of chunks)
+            prefetch -> if > 0 then chunks are read by a background thread, at most prefetch chunks ahead
+        Ouput:
+            generator of (labels, distances) for every chunk, distances[i] is the distance of i-th point
+            of the chunk from its cluster center
+        '''
+        if(len(self.cluster_centers_)==0):
+            print("\tPlease Contruct and Fit the Model First (Run the Fit method)\n")
+            return
+        chunks=iter_chunks(chunks,self.chunk_size)
+        for chunk in (prefetch_chunks(chunks,prefetch) if prefetch>0 else chunks):
+            chunk_pts=cast_points(np.asarray(chunk,dtype=np.float64),self.dtype_)
+            sq_engine=SquaredEuclidean(chunk_pts,self.chunk_size) if self.use_gemm() else None
+            labels,sq_dists=self.nearest_centroids(chunk_pts,self.cluster_centers_,sq_engine,return_sq_dists=True,
+                                                   index=self.centroid_index_)
+            yield labels,np.sqrt(sq_dists)
+
+    def transform_iter(self,chunks,prefetch=0):
+        '''
+        (prerequisite -> fit already executed (model already built))
+        streaming version of transform, memory is bounded by one chunk (plus prefetch chunks) at a time
+        Input :
+            chunks -> test data points as accepted by iter_chunks (DataFrame or numpy array is read in chunks of
+                      chunk_size rows, path of a .npy/.csv file, or an iterable of chunks)
+            prefetch -> if > 0 then chunks are read by a background thread, at most prefetch chunks ahead
+        Ouput:
+            generator of (chunk size x n_clusters) distance arrays, [i,j] is the distance of i-th point
+            of the chunk from j-th cluster center
+        '''
+        if(len(self.cluster_centers_)==0):
+            print("\tPlease Contruct and Fit the Model First (Run the Fit method)\n")
+            return
+        chunks=iter_chunks(chunks,self.chunk_size)
+        for chunk in (prefetch_chunks(chunks,prefetch) if prefetch>0 else chunks):
+            yield self.transform(chunk)
+
+    def transform(self,test_df):
+        '''
+        (prerequisite -> fit already executed (model already built))
+        Input :
+            df_test -> test data points (DataFrame or numpy array)
+        Ouput:
+            returns (n x n_clusters) numpy array of distances, [i,j] is the distance of i-th point from j-th cluster center
+            (computed in blocks of chunk_size points)
+        '''
+        if(len(self.cluster_centers_)==0):
+            print("\tPlease Contruct and Fit the Model First (Run the Fit method)\n")
+            return np.array([])
+        test_pts=cast_points(np.asarray(test_df,dtype=np.float64),self.dtype_)
+        distance=Distance(algo=self.Distance_algo,Power=self.Power,dtype=self.dtype_,metric_params=self.metric_params)
+        dists=np.empty((len(test_pts),len(self.cluster_centers_)),dtype=distance.dtype)
+        for start in range(0,len(test_pts),self.chunk_size):
+            dists[start:start+self.chunk_size]=distance.pairwise(test_pts[start:start+self.chunk_size],self.cluster_centers_)
+        return dists
+
+    def predict_topk(self,test_df,m=2):
+        '''
+        (prerequisite -> fit already executed (model already built))
+        Input :
+            df_test -> test data points (DataFrame or numpy array)
+            m -> number of nearest clusters returned for every point
+        Ouput:
+            (distances, labels), both (n x m) numpy arrays, labels[i] are the m nearest cluster numbers of i-th point
+            (nearest first) and distances[i] are its distances from them
+            (the n x n_clusters distance matrix is only built one block of chunk_size points at a time)
+        '''
+        if(len(self.cluster_centers_)==0):
+            print("\tPlease Contruct and Fit the Model First (Run the Fit method)\n")
+            return np.array([]),np.array([])
+        K=len(self.cluster_centers_)
+        if not 1<=m<=K:
+            raise ValueError("m should be in [1, "+str(K)+"] but got "+str(m))
+        test_pts=cast_points(np.asarray(test_df,dtype=np.float64),self.dtype_)
+        # euclidean is ranked by squared distance (square root only of the m selected distances)
+        is_euclidean,distance=self.ranking_distance()
+        labels=np.empty((len(test_pts),m),dtype=np.int64)
+        dists=np.empty((len(test_pts),m),dtype=np.float64)
+        for start in range(0,len(test_pts),self.chunk_size):
+            block_dists=distance.pairwise(test_pts[start:start+self.chunk_size],self.cluster_centers_)
+            rows=np.arange(len(block_dists))[:,None]
+            # m smallest distances of every row (unordered), then sorting only those m
+            top=np.argpartition(block_dists,m-1,axis=1)[:,:m] if m<K else np.tile(np.arange(K),(len(block_dists),1))
+            top=top[rows,np.argsort(block_dists[rows,top],axis=1,kind='stable')]
+            labels[start:start+len(block_dists)]=top
+            dists[start:start+len(block_dists)]=block_dists[rows,top]
+        if is_euclidean:
+            dists=np.sqrt(dists)
+        return dists,labels
+
+    def measure_recall(self,test_df,sample_size=1000):
+        '''
+        (prerequisite -> fit already executed (model already built))
+        it returns recall of the approximate (ivf) search on a sample of test_df, i.e fraction of points for
+        which the found centroid is (one of) the exact nearest centroids
+        '''
+        test_pts=cast_points(test_df.to_numpy(dtype=np.float64),self.dtype_)
+        return self.search_recall(test_pts,sample_size)
+
     def specs(self):
         '''
         return Model Specifications (inertia and No. of features on which model trained )
@@ -306,22 +852,329 @@ class K_Means:
 
 
     # Helper Functions
+    def ranking_distance(self):
+        '''
+        this function returns (is_euclidean, Distance object used to rank centroids), euclidean distance
+        is ranked by squared euclidean distance (no square root)
+        '''
+        is_euclidean=get_metric(self.Distance_algo).name=='euclidean'
+        if is_euclidean:
+            return True,Distance(algo='sqeuclidean',dtype=self.dtype_)
+        return False,Distance(algo=self.Distance_algo,Power=self.Power,dtype=self.dtype_,metric_params=self.metric_params)
+
+    def paired_sq_dists(self,pts,centroids,clusters):
+        '''
+        this function returns squared distance of every point from its given centroid (centroids[clusters[i]])
+        '''
+        is_euclidean,distance=self.ranking_distance()
+        sq_dists=np.empty(len(pts),dtype=np.float64)
+        for start in range(0,len(pts),self.chunk_size):
+            stop=start+self.chunk_size
+            dists=distance.paired(pts[start:stop],centroids[clusters[start:stop]])
+            sq_dists[start:stop]=dists if is_euclidean else np.square(dists)
+        return sq_dists
+
+    def search_recall(self,pts,sample_size=1000):
+        '''
+        this function compares approximate and exact nearest centroids of a random sample of pts
+        and returns the recall (ties are counted as correct)
+        '''
+        rng=np.random.default_rng(self.random_state)
+        sample=pts[rng.choice(len(pts),min(sample_size,len(pts)),replace=False)]
+        approx_nearest=self.nearest_centroids(sample,self.cluster_centers_,index=self.centroid_index_)
+        exact_nearest=self.nearest_centroids(sample,self.cluster_centers_,exact=True)
+        # found centroids are compared by their float64 distances (rounding of low precision dtypes is not a miss)
+        distance=Distance(algo=self.Distance_algo,Power=self.Power,dtype=np.float64,metric_params=self.metric_params)
+        sample=np.asarray(sample,dtype=np.float64)
+        approx_dists=distance.paired(sample,self.cluster_centers_[approx_nearest])
+        exact_dists=distance.paired(sample,self.cluster_centers_[exact_nearest])
+        return float(np.mean(approx_dists<=exact_dists*(1+1e-9)))
+
+    def build_index(self,centroids,coarse=None):
+        '''
+        this function returns CentroidIndex of centroids (ranking euclidean by squared distance)
+        if coarse is given, the coarse quantizer starts from it and is only refined by one iteration
+        (inside fit centroids move a little in every iteration, so the quantizer is not trained again)
+        '''
+        _,distance=self.ranking_distance()
+        n_train_iter=5 if coarse is None else 1
+        return CentroidIndex(centroids,distance,self.n_lists,self.n_probe,self.chunk_size,n_train_iter,
+                             random_state=self.random_state,coarse=coarse)
+
+    def use_ivf(self):
+        '''
+        this function returns True if approximate (ivf) search is used for nearest centroids
+        '''
+        if self.search not in ('exact','ivf'):
+            raise ValueError("search should be 'exact' or 'ivf' but got "+str(self.search))
+        return self.search=='ivf'
+
+    def get_init_centroids(self,n_features):
+        '''
+        this function returns the initial centroids (float64 numpy array of shape k x n_features) given by
+        warm_start or init, it returns None when centroids have to be chosen randomly
+        '''
+        if self.warm_start and len(self.cluster_centers_)>0:
+            init=self.cluster_centers_
+        elif isinstance(self.init,str):
+            if self.init!='random':
+                raise ValueError("init should be 'random' or an array of initial centroids but got '"+self.init+"'")
+            return None
+        else:
+            init=self.init
+        init=np.array(init,dtype=np.float64)
+        if init.shape!=(self.K,n_features):
+            raise ValueError("initial centroids should have shape ("+str(self.K)+", "+str(n_features)+") but got "+str(init.shape))
+        return init
+
+    def use_gemm(self):
+        '''
+        this function returns True if the SquaredEuclidean (gemm) engine is used for assignments
+        '''
+        if self.engine not in ('auto','gemm','loop'):
+            raise ValueError("engine should be one of 'auto', 'gemm' or 'loop' but got "+str(self.engine))
+        is_euclidean=get_metric(self.Distance_algo).name=='euclidean'
+        if self.engine=='gemm' and not is_euclidean:
+            raise ValueError("gemm engine only supports 'eucledian' distance")
+        return self.engine!='loop' and is_euclidean
+
+    def check_sample_weight(self,sample_weight,n):
+        '''
+        this function validates sample_weight for n points and returns it as a float numpy array
+        (if sample_weight is None then every point gets weight 1)
+        '''
+        if sample_weight is None:
+            return np.ones(n)
+        sample_weight=np.asarray(sample_weight,dtype=np.float64)
+        if sample_weight.shape!=(n,):
+            raise ValueError("sample_weight should have shape ("+str(n)+",) but got "+str(sample_weight.shape))
+        if np.any(sample_weight<0):
+            raise ValueError("sample_weight should be non negative")
+        return sample_weight
+
+    def get_n_jobs(self,n_runs):
+        '''
+        this function returns the number of threads used for n_runs runs
+        '''
+        n_jobs=1 if self.n_jobs is None else self.n_jobs
+        if n_jobs==-1:
+            n_jobs=os.cpu_count() or 1
+        if not isinstance(n_jobs,(int,np.integer)) or n_jobs<1:
+            raise ValueError("n_jobs should be a positive integer or -1 but got "+str(self.n_jobs))
+        return max(1,min(int(n_jobs),n_runs))
+
     def K_uniq_rand_ints(self,K,N,random_state):
         '''
         this function takes integer N as input and it generates K unique
         integer values in range [0,N).
         it return a numpy array containing unique random values
+        (random_state can be a seed or a SeedSequence)
+        (if K>N then every value is used once and the remaining K-N values are random repeats)
         '''
         # we use default_rng to construct a random generator using seed(its new method)
-        # in this function we use 2 layer of randomness
         rng = np.random.default_rng(random_state)
-        idxs=np.arange(N)
-        rng.shuffle(idxs)
-        choosed_idxs=rng.choice(N,K,replace=False)
-        return idxs[choosed_idxs]
+        if K>N:
+            return np.concatenate([rng.permutation(N),rng.choice(N,K-N)])
+        return rng.choice(N,K,replace=False)
 
 # My K_Means class ends here
 
+"""###**Bisecting K-means (hierarchical) Implementation**
+>repeatedly splits the cluster with highest SSE into 2 clusters using K_Means, it gives a cluster tree
+"""
+
+class ClusterNode:
+    def __init__(self,center,sse,weight,n_points,depth):
+        self.center=center # (weighted) mean of points of this cluster
+        self.sse=sse # (weighted) sum of squared distances of points of this cluster from center
+        self.weight=weight # total weight of points of this cluster
+        self.n_points=n_points # number of points in this cluster
+        self.depth=depth # depth of node in the tree (root has depth 0)
+        self.left=None # children (None for a leaf)
+        self.right=None
+        self.label=-1 # cluster label of a leaf (-1 for internal nodes)
+
+    def is_leaf(self):
+        return self.left is None
+
+
+class Bisecting_K_Means:
+    def __init__(self,n_clusters=8,Distance_algo='eucledian',Power=2,max_iter=300,random_state=100,dtype=np.float64,
+                 metric_params=None,tol=1e-4):
+        self.K=n_clusters
+        self.Distance_algo=Distance_algo
+        self.Power=Power #Power used for Minkowski distance
+        self.metric_params=metric_params
+        # validating the distance algo and its params (raises ValueError)
+        Distance(algo=Distance_algo,Power=Power,metric_params=metric_params)
+        self.max_iter=max_iter # max_iter of every 2-means split
+        self.random_state=random_state
+        self.dtype=dtype
+        self.tol=tol
+        #additional data attribute (similar to sklearn BisectingKMeans)
+        self.tree_=None # root ClusterNode of the cluster tree
+        self.cluster_centers_=np.array([])
+        self.labels_=np.array([])
+        self.inertia_=0
+        self.n_features_in_=0
+        self.feature_names_in_=np.array([])
+
+    def get_params(self):
+        '''
+        Returns Bisecting_K_Means Model parameters with their values
+        '''
+        params=dict()
+        params['n_clusters']=self.K
+        params['Distance_algo']=self.Distance_algo
+        params['Power']=self.Power
+        params['metric_params']=self.metric_params
+        params['max_iter']=self.max_iter
+        params['random_state']=self.random_state
+        params['dtype']=self.dtype
+        params['tol']=self.tol
+        return params
+
+    def fit(self,df,sample_weight=None):
+        '''
+        Input
+            df -> a data frame containing n data points with d features each
+            sample_weight -> weight of every point (if not given every point has weight 1)
+        Output
+            the predicted cluster number corresponding to each point
+        '''
+        pts=df.to_numpy(dtype=np.float64,copy=True) #convert df to np array
+        weights=self.make_2_means().check_sample_weight(sample_weight,len(pts))
+        # root cluster contains every point
+        all_idxs=np.arange(len(pts))
+        root=self.make_node(pts,weights,all_idxs,depth=0)
+        # leaf_idxs -> leaf node to indexes of its points, unsplittable -> leaves that can not be split further
+        leaf_idxs={root:all_idxs}
+        unsplittable=set()
+        # every 2-means split gets its own seed spawned from random_state
+        seed_seq=np.random.SeedSequence(self.random_state)
+        while len(leaf_idxs)<self.K:
+            candidates=[node for node in leaf_idxs if node not in unsplittable]
+            if len(candidates)==0:
+                warnings.warn("only "+str(len(leaf_idxs))+" clusters could be formed (remaining clusters have identical points)",
+                              RuntimeWarning)
+                break
+            # split the cluster with highest SSE
+            node=max(candidates,key=lambda leaf: leaf.sse)
+            idxs=leaf_idxs[node]
+            cluster_pts=pts[idxs]
+            if len(idxs)<2 or not np.any(np.ptp(cluster_pts,axis=0)>0):
+                unsplittable.add(node)
+                continue
+            # 2-means on the points of this cluster only (reusing K_Means)
+            model=self.make_2_means(int(seed_seq.spawn(1)[0].generate_state(1)[0]))
+            model.fit(pd.DataFrame(cluster_pts),sample_weight=weights[idxs])
+            split=np.asarray(model.labels_)
+            left_idxs=idxs[split==0]
+            right_idxs=idxs[split==1]
+            if len(left_idxs)==0 or len(right_idxs)==0:
+                unsplittable.add(node)
+                continue
+            node.left=self.make_node(pts,weights,left_idxs,node.depth+1)
+            node.right=self.make_node(pts,weights,right_idxs,node.depth+1)
+            del leaf_idxs[node]
+            leaf_idxs[node.left]=left_idxs
+            leaf_idxs[node.right]=right_idxs
+        # labeling leaves in tree order (so that sibling clusters have adjacent labels)
+        labels=np.empty(len(pts),dtype=np.int64)
+        leaves=self.get_leaves(root)
+        for label,leaf in enumerate(leaves):
+            leaf.label=label
+            labels[leaf_idxs[leaf]]=label
+        # store attribute values
+        self.tree_=root
+        self.cluster_centers_=np.array([leaf.center for leaf in leaves])
+        self.labels_=labels
+        self.inertia_=float(sum(leaf.sse for leaf in leaves))
+        self.n_features_in_=pts.shape[1]
+        self.feature_names_in_=np.array(df.columns)
+        return self.labels_
+
+    def predict(self,test_df):
+        '''
+        (prerequisite -> fit already executed (model already built))
+        Input :
+            df_test -> test data points
+        Ouput:
+            returns Cluster number corresponding to each test data point
+            (found by descending the cluster tree, i.e. only 2 distances per level are computed)
+        '''
+        # Print error if models is prerequisite not satisfied
+        if self.tree_ is None:
+            print("\tPlease Contruct and Fit the Model First (Run the Fit method)\n")
+            return np.array([])
+        test_pts=test_df.to_numpy(dtype=np.float64,copy=True) #convert test_df to np array
+        distance=Distance(algo=self.Distance_algo,Power=self.Power,dtype=self.dtype,metric_params=self.metric_params)
+        labels=np.empty(len(test_pts),dtype=np.int64)
+        # every (node, indexes of points that reached it) is processed once, points move to the nearer child
+        stack=[(self.tree_,np.arange(len(test_pts)))]
+        while stack:
+            node,idxs=stack.pop()
+            if len(idxs)==0:
+                continue
+            if node.is_leaf():
+                labels[idxs]=node.label
+                continue
+            node_pts=test_pts[idxs]
+            go_left=distance.calc_many(node.left.center,node_pts)<=distance.calc_many(node.right.center,node_pts)
+            stack.append((node.left,idxs[go_left]))
+            stack.append((node.right,idxs[~go_left]))
+        return labels
+
+    def specs(self):
+        '''
+        return Model Specifications (inertia, No. of features and depth of cluster tree)
+        '''
+        specs=dict()
+        specs['inertia_']=self.inertia_
+        specs['n_features_in_']=self.n_features_in_
+        specs['tree_depth']=max((leaf.depth for leaf in self.get_leaves(self.tree_)),default=0) if self.tree_ else 0
+        return specs
+
+    # Helper Functions
+    def make_2_means(self,random_state=None):
+        '''
+        this function returns the K_Means model (n_clusters=2) used for splitting a cluster
+        '''
+        return K_Means(n_clusters=2,Distance_algo=self.Distance_algo,Power=self.Power,max_iter=self.max_iter,
+                       random_state=self.random_state if random_state is None else random_state,dtype=self.dtype,
+                       metric_params=self.metric_params,tol=self.tol)
+
+    def make_node(self,pts,weights,idxs,depth):
+        '''
+        this function returns ClusterNode of the points pts[idxs] (with its center and SSE)
+        '''
+        cluster_pts=pts[idxs]
+        cluster_weights=weights[idxs]
+        weight=cluster_weights.sum()
+        if weight>0:
+            center=np.average(cluster_pts,axis=0,weights=cluster_weights)
+        else:
+            center=cluster_pts.mean(axis=0)
+        sse=self.make_2_means().squared_distance_sum(cluster_pts,center,cluster_weights)
+        return ClusterNode(center,float(sse),float(weight),len(idxs),depth)
+
+    def get_leaves(self,root):
+        '''
+        this function returns list of leaves of the tree in left to right order
+        '''
+        leaves=[]
+        stack=[root]
+        while stack:
+            node=stack.pop()
+            if node.is_leaf():
+                leaves.append(node)
+            else:
+                stack.append(node.right)
+                stack.append(node.left)
+        return leaves
+
+# My Bisecting_K_Means class ends here
+
 """###**Loading Data and Refining**"""
 
 # Loading iris dataset from pandas
@@ -362,10 +1215,8 @@ df=scaleDf(df)
 # View of df after scaling
 df.head()
 
-# Actual (Given data) clusters
-given_clusters=Clusters(df,labels)
-# plotting original cluters
-plotClusters(given_clusters)
+# plotting original (Given data) cluters
+plotLabels(df,labels)
 
 """###**KMeans using of Sklearn Library**"""
 
@@ -383,14 +1234,12 @@ print("Input Features = ",model.n_features_in_)
 print("Iteration Runned = ",model.n_iter_)
 print("")
 
-# predicted clusters
-predicted_clusters=Clusters(df,predicted_labels)
 # plotting predicted cluters using sklearn K-means model
 '''
 Colors of clusters are diffrent because K-means is Unsupervised learning so,
 it autimatically put cluster names as 0,1,2...
 '''
-plotClusters(predicted_clusters)
+plotLabels(df,predicted_labels)
 
 """###**K_Means Using Our Algorithm**"""
 
@@ -408,14 +1257,12 @@ print("Input Features = ",mymodel.n_features_in_)
 print("Iteration Runned = ",mymodel.n_iter_)
 print("")
 
-# predicted clusters using my K_Means model
-my_predicted_clusters=Clusters(df,my_predicted_labels)
 # plotting predicted cluters using my KMeans model
 '''
 Colors of clusters are diffrent because K_Means is Unsupervised learning so,
 it autimatically put cluster names as 0,1,2...
 '''
-plotClusters(my_predicted_clusters)
+plotLabels(df,my_predicted_labels)
 
 """***Any Improvments or Suggestions are welcomed***
 
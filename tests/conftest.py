@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""Shared fixtures of the tests, the notebook exports are loaded once (definitions only, no demo cells)"""
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmark_clustering import load_notebook_module
+
+
+@pytest.fixture(scope='session')
+def km():
+    return load_notebook_module('kmeans_algo_from_scratch.py','kmeans_algo_from_scratch')
+
+
+@pytest.fixture(scope='session')
+def db():
+    return load_notebook_module('DBSCAN_algo_full_explanation.py','DBSCAN_algo_full_explanation')
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""DB_SCAN fit against sklearn DBSCAN, labels extracted from the OPTICS ordering and duplicate collapsing"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn import datasets
+from sklearn.cluster import DBSCAN
+
+MIN_SAMPLES=5
+
+
+@pytest.fixture(scope='module')
+def df():
+    X,_=datasets.make_blobs(n_samples=600,n_features=2,centers=4,cluster_std=0.6,random_state=0)
+    noise=np.random.default_rng(0).uniform(X.min(axis=0),X.max(axis=0),(60,2))
+    return pd.DataFrame(np.vstack([X,noise]))
+
+
+@pytest.fixture(scope='module')
+def duplicated_df(df):
+    # every point is repeated 1 to 3 times (in shuffled order)
+    rng=np.random.default_rng(1)
+    idxs=np.repeat(np.arange(len(df)),rng.integers(1,4,len(df)))
+    return df.iloc[rng.permutation(idxs)].reset_index(drop=True)
+
+
+def same_partition(labels,other_labels):
+    # True if both labelings split the points in the same groups (only cluster numbers can differ)
+    pairs=set(zip(labels,other_labels))
+    return len(pairs)==len(set(labels))==len(set(other_labels))
+
+
+@pytest.mark.parametrize('engine',['gemm','loop'])
+@pytest.mark.parametrize('eps',[0.3,0.5,0.8])
+def test_fit_same_as_sklearn(db,df,engine,eps):
+    model=db.DB_SCAN(eps=eps,min_samples=MIN_SAMPLES,engine=engine)
+    model.fit(df)
+    ref=DBSCAN(eps=eps,min_samples=MIN_SAMPLES).fit(df)
+    core=np.zeros(len(df),dtype=bool)
+    core[ref.core_sample_indices_]=True
+    # core points and noise are same, border points can join any of the clusters they touch
+    assert same_partition(model.labels_[core],ref.labels_[core])
+    assert np.array_equal(model.labels_==-1,ref.labels_==-1)
+
+
+@pytest.mark.parametrize('engine',['gemm','loop'])
+def test_extract_dbscan_core_points_same_as_fit(db,df,engine):
+    ordering_model=db.DB_SCAN(min_samples=MIN_SAMPLES,engine=engine)
+    ordering_model.fit_ordering(df,max_eps=1.0)
+    for eps in (0.3,0.5,0.8):
+        labels=ordering_model.extract_dbscan(eps)
+        model=db.DB_SCAN(eps=eps,min_samples=MIN_SAMPLES,engine=engine)
+        model.fit(df)
+        ref=DBSCAN(eps=eps,min_samples=MIN_SAMPLES).fit(df)
+        core=np.zeros(len(df),dtype=bool)
+        core[ref.core_sample_indices_]=True
+        assert np.array_equal(ordering_model.core_distances_<=eps,core)
+        assert np.all(labels[core]>=0)
+        assert same_partition(labels[core],model.labels_[core])
+        # a border point can only be missed (labelled noise) by the extraction, never the other way
+        assert np.all(labels[model.labels_==-1]==-1)
+
+
+@pytest.mark.parametrize('engine',['gemm','loop'])
+def test_dedup_same_as_repeated_points(db,duplicated_df,engine):
+    model=db.DB_SCAN(eps=0.5,min_samples=MIN_SAMPLES,engine=engine)
+    model.fit(duplicated_df)
+    dedup_model=db.DB_SCAN(eps=0.5,min_samples=MIN_SAMPLES,engine=engine,dedup=True)
+    dedup_model.fit(duplicated_df)
+    assert dedup_model.n_unique_<len(duplicated_df)
+    assert np.array_equal(dedup_model.labels_,model.labels_)
+    assert np.isclose(dedup_model.inertia_,model.inertia_)
+    assert np.allclose(dedup_model.cluster_centers_,model.cluster_centers_)
+
+
+def test_dedup_ordering_same_as_repeated_points(db,duplicated_df):
+    model=db.DB_SCAN(min_samples=MIN_SAMPLES)
+    model.fit_ordering(duplicated_df,max_eps=1.0)
+    dedup_model=db.DB_SCAN(min_samples=MIN_SAMPLES,dedup=True)
+    dedup_model.fit_ordering(duplicated_df,max_eps=1.0)
+    for eps in (0.3,0.5,0.8):
+        labels=model.extract_dbscan(eps)
+        dedup_labels=dedup_model.extract_dbscan(eps)
+        # (visiting order differs, so only core points are compared, see extract_dbscan)
+        core=model.core_distances_<=eps
+        assert np.array_equal(dedup_model.core_distances_[dedup_model.ordering_inverse_]<=eps,core)
+        assert same_partition(dedup_labels[core],labels[core])
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""K_Means duplicate collapsing, low precision storage, approximate (ivf) search and serving methods"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn import datasets
+
+
+@pytest.fixture(scope='module')
+def df():
+    rng=np.random.default_rng(0)
+    return pd.DataFrame(rng.normal(size=(5000,4)),columns=list('abcd'))
+
+
+@pytest.fixture(scope='module')
+def model(km,df):
+    model=km.K_Means(n_clusters=6,random_state=0,chunk_size=700)
+    model.fit(df)
+    return model
+
+
+@pytest.mark.parametrize('source',['dataframe','array','npy','csv','chunks'])
+@pytest.mark.parametrize('prefetch',[0,2])
+def test_streaming_matches_predict_and_transform(km,df,model,tmp_path,source,prefetch):
+    if source=='dataframe':
+        chunks=df
+    elif source=='array':
+        chunks=df.to_numpy()
+    elif source=='npy':
+        chunks=str(tmp_path/'points.npy')
+        np.save(chunks,df.to_numpy())
+    elif source=='csv':
+        chunks=str(tmp_path/'points.csv')
+        df.to_csv(chunks,index=False)
+    else:
+        chunks=list(km.iter_chunks(df,333))
+    labels=np.concatenate([chunk_labels for chunk_labels,_ in model.predict_iter(chunks,prefetch=prefetch)])
+    dists=np.concatenate(list(model.transform_iter(chunks,prefetch=prefetch)))
+    assert np.array_equal(labels,model.predict(df))
+    assert np.allclose(dists,model.transform(df))
+
+
+@pytest.fixture(scope='module')
+def blobs_df():
+    X,_=datasets.make_blobs(n_samples=20000,n_features=8,centers=200,random_state=0)
+    return pd.DataFrame(X)
+
+
+@pytest.mark.parametrize('engine',['gemm','loop'])
+def test_dedup_same_as_repeated_points(km,df,engine):
+    # every point is repeated 1 to 3 times, both fits start from the same centroids
+    rng=np.random.default_rng(1)
+    duplicated_df=df.iloc[np.repeat(np.arange(len(df)),rng.integers(1,4,len(df)))].reset_index(drop=True)
+    init=df.to_numpy()[:6]
+    model=km.K_Means(n_clusters=6,init=init,engine=engine)
+    model.fit(duplicated_df)
+    dedup_model=km.K_Means(n_clusters=6,init=init,engine=engine,dedup=True)
+    dedup_model.fit(duplicated_df)
+    assert dedup_model.n_unique_==len(df)
+    assert np.array_equal(dedup_model.labels_,model.labels_)
+    assert np.allclose(dedup_model.cluster_centers_,model.cluster_centers_)
+    assert np.isclose(dedup_model.inertia_,model.inertia_)
+
+
+def test_cast_points_falls_back_to_wider_dtype(km,df):
+    # float16 can not resolve the spread of points far from the origin
+    far_pts=df.to_numpy()+1e4
+    with pytest.warns(RuntimeWarning,match='precision'):
+        pts=km.cast_points(far_pts,np.float16)
+    assert pts.dtype==np.float32
+    with pytest.warns(RuntimeWarning,match='precision'):
+        model=km.K_Means(n_clusters=6,random_state=0,dtype=np.float16)
+        model.fit(pd.DataFrame(far_pts))
+    assert model.dtype_==np.float32
+    assert km.cast_points(df.to_numpy(),np.float32).dtype==np.float32
+
+
+@pytest.mark.parametrize('dtype',[np.float64,np.float32])
+def test_ivf_search_recall(km,blobs_df,dtype):
+    model=km.K_Means(n_clusters=200,n_init=1,random_state=0,dtype=dtype,search='ivf',n_probe=4)
+    model.fit(blobs_df)
+    assert model.assign_recall_>=0.95
+    assert model.measure_recall(blobs_df,sample_size=5000)>=0.95
+    # predict with the index agrees with the exact nearest centroids
+    pts=blobs_df.to_numpy()
+    exact=model.nearest_centroids(pts,model.cluster_centers_,exact=True)
+    assert np.mean(model.predict(blobs_df)==exact)>=0.95
+    # probing every list is exact search
+    model.n_probe=model.centroid_index_.n_lists
+    model.centroid_index_=model.build_index(model.cluster_centers_)
+    assert model.measure_recall(blobs_df,sample_size=5000)==1.0
+
+
+@pytest.mark.parametrize('Distance_algo',['euclidean','manhattan','chebyshev'])
+def test_predict_topk_same_as_sorted_transform(km,df,Distance_algo):
+    model=km.K_Means(n_clusters=6,random_state=0,Distance_algo=Distance_algo,n_init=2)
+    model.fit(df)
+    dists,labels=model.predict_topk(df,m=3)
+    all_dists=model.transform(df)
+    assert np.array_equal(labels,np.argsort(all_dists,axis=1,kind='stable')[:,:3])
+    assert np.allclose(dists,np.take_along_axis(all_dists,labels,axis=1))
+    assert np.array_equal(labels[:,0],model.predict(df))
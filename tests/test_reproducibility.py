@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Reproducibility of K_Means and Bisecting_K_Means
+
+A fit with a given random_state must give bitwise same labels and centroids for any n_jobs and
+chunk_size (for a given engine and dtype), so that the parallel and batched paths can be used
+without losing reproducibility.
+"""
+
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn import datasets
+
+
+@pytest.fixture(scope='module')
+def df():
+    X,_=datasets.make_blobs(n_samples=3000,n_features=5,centers=12,cluster_std=2.5,random_state=0)
+    return pd.DataFrame(X)
+
+
+@pytest.fixture(scope='module')
+def quantized_df():
+    # few distinct values far from the origin, so many points are at exactly equal distance (ties)
+    rng=np.random.default_rng(0)
+    return pd.DataFrame(rng.integers(0,7,(5000,3))*0.1+123.4)
+
+
+def fit(km,df,**params):
+    model=km.K_Means(n_clusters=12,random_state=7,**params)
+    model.fit(df)
+    return model
+
+
+@pytest.mark.parametrize('engine',['gemm','loop'])
+@pytest.mark.parametrize('dtype',[np.float64,np.float32])
+def test_kmeans_same_result_for_any_n_jobs_and_chunk_size(km,df,engine,dtype):
+    reference=fit(km,df,engine=engine,dtype=dtype)
+    for n_jobs in (1,2,4):
+        for chunk_size in (4096,500,37):
+            model=fit(km,df,engine=engine,dtype=dtype,n_jobs=n_jobs,chunk_size=chunk_size)
+            assert np.array_equal(model.labels_,reference.labels_)
+            assert np.array_equal(model.cluster_centers_,reference.cluster_centers_)
+            assert model.inertia_==reference.inertia_
+
+
+@pytest.mark.parametrize('engine',['gemm','loop'])
+@pytest.mark.parametrize('dtype',[np.float64,np.float32])
+def test_kmeans_same_result_on_ties_for_any_n_jobs_and_chunk_size(km,quantized_df,engine,dtype):
+    reference=fit(km,quantized_df,engine=engine,dtype=dtype)
+    for n_jobs,chunk_size in ((1,500),(1,37),(3,4096),(3,37)):
+        model=fit(km,quantized_df,engine=engine,dtype=dtype,n_jobs=n_jobs,chunk_size=chunk_size)
+        assert np.array_equal(model.labels_,reference.labels_)
+        assert np.array_equal(model.cluster_centers_,reference.cluster_centers_)
+
+
+def test_kmeans_same_result_with_dedup(km,df):
+    dup_df=pd.concat([df,df.iloc[::3]],ignore_index=True)
+    reference=fit(km,dup_df,dedup=True)
+    model=fit(km,dup_df,dedup=True,n_jobs=3,chunk_size=100)
+    assert np.array_equal(model.labels_,reference.labels_)
+    assert np.array_equal(model.cluster_centers_,reference.cluster_centers_)
+
+
+def test_kmeans_runs_have_different_seeds(km,df):
+    model=fit(km,df,trace=True)
+    run_inertias=[event['inertia'] for event in model.trace_.events if event['event']=='run_end']
+    assert len(run_inertias)==model.n_init
+    assert len(set(run_inertias))>1
+
+
+def test_kmeans_trace_counters_same_for_any_n_jobs(km,df):
+    reference=fit(km,df,trace=True)
+    model=fit(km,df,trace=True,n_jobs=4)
+    assert model.trace_.counters==reference.trace_.counters
+
+
+def test_kmeans_callback_abort_same_for_any_n_jobs(km,df):
+    # aborting in run 1 keeps the best of runs 0 and 1, even if later runs were already started by other threads
+    def abort_in_run_1(info):
+        if info['run']==1 and info['iteration']==1:
+            # giving other threads time to start later runs
+            time.sleep(0.2)
+            return True
+        return False
+    reference=fit(km,df,callback=abort_in_run_1)
+    # (a later run is better here, so keeping it would change the result)
+    assert reference.inertia_>fit(km,df).inertia_
+    for n_jobs in (3,10):
+        model=fit(km,df,callback=abort_in_run_1,n_jobs=n_jobs)
+        assert np.array_equal(model.labels_,reference.labels_)
+        assert np.array_equal(model.cluster_centers_,reference.cluster_centers_)
+        assert model.inertia_==reference.inertia_
+
+
+def test_bisecting_kmeans_reproducible(km,df):
+    labels=[km.Bisecting_K_Means(n_clusters=8,random_state=3).fit(df) for _ in range(2)]
+    assert np.array_equal(labels[0],labels[1])